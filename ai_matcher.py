@@ -1,6 +1,9 @@
+import heapq
 import re
-import pandas as pd
+from collections import Counter
 from difflib import SequenceMatcher
+from typing import List, Tuple
+from products import Product, as_products
 
 # ==================================================
 # 🧠 CONFIG: KNOWLEDGE BASE (Keep your Trap Lists)
@@ -17,9 +20,31 @@ def _norm(s: str) -> str:
 # ⚡ LITE MATCHER (No Heavy AI)
 # ==================================================
 class SmartMatcher:
+    """
+    Scores = difflib ratio(query, name) + 0.4 if the query is inside the name.
+
+    The candidate set is indexed once: lowercased names, their lengths and a
+    character -> [(candidate, count)] index. A query then gets an exact upper
+    bound for every candidate in one pass over that index (the multiset
+    character overlap, same bound as SequenceMatcher.quick_ratio), and the
+    full SequenceMatcher only runs for candidates whose bound can still reach
+    the threshold / current top-k. Scores are identical to the old
+    iterrows loop; equal scores keep the input order.
+    """
+
     def __init__(self, scraped_data: list):
-        self.df = pd.DataFrame(scraped_data)
         # We do NOT load any vector model here. RAM Saved: ~400MB.
+        self.records = as_products(scraped_data)
+        self.names = [p.name.lower() for p in self.records]
+        self.lengths = [len(n) for n in self.names]
+
+        self.char_index = {}
+        for i, name in enumerate(self.names):
+            for ch, count in Counter(name).items():
+                self.char_index.setdefault(ch, []).append((i, count))
+
+        # SequenceMatcher caches its analysis of seq2 (the name) -> build lazily, reuse per query
+        self._seq_matchers = [None] * len(self.records)
 
     # ----------------------------------------
     # 🛡️ TRAP & RULE FUNCTIONS (Keep these!)
@@ -39,33 +64,69 @@ class SmartMatcher:
         # "Coke Can" vs "Coke" = 0.8 score
         return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
-    def find_matches(self, user_query: str, threshold=0.25):
-        if self.df.empty: return []
+    def _ratio(self, i: int, q_lower: str) -> float:
+        sm = self._seq_matchers[i]
+        if sm is None:
+            sm = SequenceMatcher(None)
+            sm.set_seq2(self.names[i])
+            self._seq_matchers[i] = sm
+        sm.set_seq1(q_lower)
+        return sm.ratio()
+
+    def _upper_bounds(self, q_lower: str) -> list:
+        # Character overlap with every candidate, one pass over the index
+        overlap = [0] * len(self.records)
+        for ch, q_count in Counter(q_lower).items():
+            for i, count in self.char_index.get(ch, ()):
+                overlap[i] += count if count < q_count else q_count
+
+        lq = len(q_lower)
+        bounds = []
+        for i, name in enumerate(self.names):
+            total = lq + self.lengths[i]
+            bound = 2.0 * overlap[i] / total if total else 1.0
+            # 3. Boost for containing the exact word
+            boost = 0.4 if q_lower in name else 0.0
+            bounds.append((bound + boost, boost, i))
+        return bounds
+
+    def find_scored(self, user_query: str, threshold=0.25, top_k=20) -> List[Tuple[float, Product]]:
+        """
+        Best matches first, as (score, Product) pairs (no copies).
+        """
+        if not self.records: return []
 
         q = user_query.strip()
-        final_results = []
-        
-        for _, row in self.df.iterrows():
-            name = str(row["Product Name"])
-            
+        q_lower = q.lower()
+
+        # Best bounds first: once a bound can't beat the k-th best score, stop
+        bounds = self._upper_bounds(q_lower)
+        bounds.sort(key=lambda b: (-b[0], b[2]))
+
+        heap = []  # (score, -index) -> smallest kept score on top
+        for bound, boost, i in bounds:
+            floor = threshold if len(heap) < top_k else max(threshold, heap[0][0])
+            if bound < floor: break
+
             # 1. Run Rules (Optional but recommended)
             # if self._is_trap(name, q): continue
 
             # 2. Calculate Score
-            score = self.calculate_similarity(q, name)
-            
-            # 3. Boost for containing the exact word
-            if q.lower() in name.lower():
-                score += 0.4  # Big bonus if "Coke" is inside the name
-            
-            if score >= threshold:
-                row["score"] = score
-                final_results.append(row)
+            score = self._ratio(i, q_lower) + boost
+            if score < threshold: continue
 
-        if not final_results: return []
+            item = (score, -i)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
 
         # Sort by best match
-        df_final = pd.DataFrame(final_results)
-        df_final = df_final.sort_values(by="score", ascending=False).head(20)
-        
-        return df_final.to_dict(orient="records")
\ No newline at end of file
+        ranked = sorted(heap, key=lambda s: (-s[0], -s[1]))
+        return [(score, self.records[-neg_i]) for score, neg_i in ranked]
+
+    def find_matches(self, user_query: str, threshold=0.25, top_k=20) -> List[dict]:
+        """
+        Same ranking as find_scored, as legacy row dicts with a "score" key.
+        """
+        return [{**p.to_dict(), "score": score} for score, p in self.find_scored(user_query, threshold, top_k)]
@@ -0,0 +1,162 @@
+"""
+End-to-end load test of /api/compare against the stand-in retailers:
+the real app (cache, catalog, matcher, HTTP scraping) in-process through
+httpx.ASGITransport, with a throwaway SQLite file per scenario.
+App startup hooks don't run here: no browser pool, no job workers / warmer
+(stale refreshes are only queued), so numbers are the request path alone.
+
+    cold  - empty cache: every item is scraped (or answered by the catalog)
+    warm  - the same lists again: every item is a cache hit
+    mixed - half the vocabulary primed, each item a hit with probability hit_ratio
+"""
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from typing import List
+import httpx
+import database
+import catalog
+import job_queue
+import metrics
+import grocery_api
+from retailer_adapters import close_http_client
+from benchmarks.standin_server import start_server, point_adapters
+
+# Shopping-list vocabulary (things the fixtures carry)
+ITEMS = [
+    "fresh milk", "uht milk", "pasteurized milk", "eggs", "omega-3 eggs", "ไข่ไก่", "jasmine rice", "brown rice",
+    "ข้าวหอมมะลิ", "chicken breast", "chicken thigh", "pork belly", "minced pork", "หมูสับ", "sandwich bread",
+    "whole wheat bread", "drinking water", "palm oil", "rice bran oil", "refined sugar", "brown sugar",
+    "instant coffee", "3in1 coffee", "instant noodles", "tom yum noodles", "shampoo", "orange juice",
+    "salmon fillet", "banana", "tomato",
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _summary(latencies: List[float], wall: float, items: int) -> dict:
+    ms = [x * 1000 for x in latencies]
+    return {
+        "requests": len(ms),
+        "items": items,
+        "wall_seconds": round(wall, 3),
+        "requests_per_sec": round(len(ms) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(ms), 2),
+            "p50": round(_percentile(ms, 50), 2),
+            "p95": round(_percentile(ms, 95), 2),
+            "p99": round(_percentile(ms, 99), 2),
+            "max": round(max(ms), 2),
+        },
+    }
+
+
+def _counters() -> dict:
+    return {
+        "cache": {r: metrics.CACHE_LOOKUPS.value(result=r) for r in ("hit", "stale", "miss")},
+        "retailer_scrapes": metrics.SCRAPES.total(),
+    }
+
+
+def _delta(before: dict, after: dict) -> dict:
+    return {
+        "cache": {k: after["cache"][k] - before["cache"][k] for k in before["cache"]},
+        "retailer_scrapes": after["retailer_scrapes"] - before["retailer_scrapes"],
+    }
+
+
+class _Scenario:
+    """Fresh cache DB + an httpx client talking to the app in-process."""
+
+    def __init__(self, workdir: str, name: str):
+        self.path = os.path.join(workdir, f"{name}.db")
+
+    async def __aenter__(self):
+        await database.flush()
+        database.DB_NAME = self.path  # pool + memory tier follow the new file
+        database.init_db()
+        catalog.init_catalog()
+        job_queue.init_jobs()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=grocery_api.app), base_url="http://bench", timeout=120)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        await database.flush()
+
+    async def compare(self, items: List[str]) -> float:
+        t0 = time.perf_counter()
+        resp = await self.client.post("/api/compare", json={"items": items})
+        resp.raise_for_status()
+        return time.perf_counter() - t0
+
+    async def run(self, lists: List[List[str]], concurrency: int) -> dict:
+        queue = list(lists)
+        latencies = []
+
+        async def worker():
+            while queue:
+                latencies.append(await self.compare(queue.pop(0)))
+
+        before = _counters()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+        return {**_summary(latencies, wall, sum(len(x) for x in lists)), **_delta(before, _counters())}
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def run_e2e(concurrency: int = 4, list_size: int = 3, warm_rounds: int = 5, mixed_requests: int = 30,
+                  hit_ratio: float = 0.8, latency: float = 0.05, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    server, base_urls = start_server(latency=latency)
+    point_adapters(base_urls)
+    workdir = tempfile.mkdtemp(prefix="grocery-bench-")
+    results = {"config": {
+        "concurrency": concurrency, "list_size": list_size, "warm_rounds": warm_rounds,
+        "mixed_requests": mixed_requests, "hit_ratio": hit_ratio, "standin_latency_ms": latency * 1000,
+        "vocabulary": len(ITEMS),
+    }}
+    try:
+        vocab = list(ITEMS)
+        rng.shuffle(vocab)
+        lists = _chunks(vocab, list_size)
+
+        # COLD then WARM on the same cache
+        async with _Scenario(workdir, "cold_warm") as s:
+            results["cold"] = await s.run(lists, concurrency)
+            results["warm"] = await s.run(lists * warm_rounds, concurrency)
+
+        # MIXED: half primed (not measured), then draw hits / misses
+        async with _Scenario(workdir, "mixed") as s:
+            primed, fresh = vocab[:len(vocab) // 2], vocab[len(vocab) // 2:]
+            await s.run(_chunks(primed, list_size), concurrency)
+            mixed_lists = []
+            for _ in range(mixed_requests):
+                lst = []
+                for _ in range(list_size):
+                    if fresh and rng.random() >= hit_ratio:
+                        lst.append(fresh.pop())
+                    else:
+                        lst.append(rng.choice(primed))
+                mixed_lists.append(lst)
+            results["mixed"] = await s.run(mixed_lists, concurrency)
+    finally:
+        server.shutdown()
+        await close_http_client()
+        database.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
@@ -0,0 +1,121 @@
+"""
+Micro-benchmarks for the per-card parsing helpers and the matcher,
+fed with the cards in benchmarks/fixtures/.
+"""
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+import retailer_adapters
+from ai_matcher import SmartMatcher
+from products import Product
+from retailer_scraper import build_products, clean_product_name, clean_text, extract_price, normalize_unit_data
+from benchmarks.standin_server import FIXTURE_DIR, FIXTURES
+
+MATCH_QUERIES = ["fresh milk", "eggs", "jasmine rice 5kg", "chicken breast", "drinking water", "instant noodles",
+                 "ไข่ไก่", "palm oil", "coffee", "shampoo"]
+# 24 = one scrape (3 retailers x 8), 200 = a catalog lookup, 1000 = stress
+CANDIDATE_COUNTS = (24, 200, 1000)
+
+
+def load_cards() -> List[Dict[str, str]]:
+    """Every card in every fixture, with the retailer it came from."""
+    cards = []
+    for name, (_, filename) in FIXTURES.items():
+        html = open(os.path.join(FIXTURE_DIR, filename), encoding="utf-8").read()
+        _, found = retailer_adapters.get_adapter(name).parse_html(html)
+        cards.extend(dict(card, retailer=name) for card in found)
+    return cards
+
+
+def bench(fn: Callable[[], int], min_time: float = 0.2, repeat: int = 5) -> dict:
+    """
+    Run fn (returns how many operations it did) repeatedly; report the
+    median time per operation over `repeat` samples of >= min_time each.
+    """
+    fn()  # warm-up (lazy compiles, caches)
+    samples = []
+    for _ in range(repeat):
+        ops = 0
+        t0 = time.perf_counter()
+        while True:
+            ops += fn()
+            elapsed = time.perf_counter() - t0
+            if elapsed >= min_time: break
+        samples.append(elapsed / ops)
+    per_op = statistics.median(samples)
+    return {
+        "ns_per_op": round(per_op * 1e9, 1),
+        "ops_per_sec": round(1 / per_op, 1),
+        "spread_pct": round(100 * (max(samples) - min(samples)) / per_op, 1),
+    }
+
+
+def candidates(products: List[Product], n: int) -> List[Product]:
+    """n candidates: the fixture products, repeated with varied names/prices."""
+    out = []
+    i = 0
+    while len(out) < n:
+        p = products[i % len(products)]
+        rnd = i // len(products)
+        name = p.name if rnd == 0 else f"{p.name} Pack {rnd + 1}"
+        out.append(Product(p.retailer, name, p.price * (1 + rnd * 0.01), p.unit_price, p.base_qty, p.base_unit, p.quantity))
+        i += 1
+    return out
+
+
+def run_micro(min_time: float = 0.2, repeat: int = 5) -> dict:
+    cards = load_cards()
+    names = [clean_text(c["name"]) for c in cards]
+    texts = [clean_text(c["text"]) for c in cards]
+    prices = [extract_price(t) for t in texts]
+    cleaned = [clean_product_name(n, p) for n, p in zip(names, prices)]
+    products = []
+    for name in FIXTURES:
+        products.extend(build_products(name, [c for c in cards if c["retailer"] == name], max_items=len(cards)))
+
+    def price_all():
+        for t in texts: extract_price(t)
+        return len(texts)
+
+    def clean_all():
+        for n, p in zip(names, prices): clean_product_name(n, p)
+        return len(names)
+
+    def units_all():
+        for n, t, p in zip(cleaned, texts, prices): normalize_unit_data(n, t, p)
+        return len(texts)
+
+    def build_all():
+        for name in FIXTURES:
+            build_products(name, cards, max_items=len(cards))
+        return len(FIXTURES) * len(cards)
+
+    results = {
+        "cards": len(cards),
+        "extract_price": bench(price_all, min_time, repeat),
+        "clean_product_name": bench(clean_all, min_time, repeat),
+        "normalize_unit_data": bench(units_all, min_time, repeat),
+        "build_products_per_card": bench(build_all, min_time, repeat),
+        "smartmatcher": {},
+    }
+
+    for n in CANDIDATE_COUNTS:
+        pool = candidates(products, n)
+
+        def build_and_match():
+            engine = SmartMatcher(pool)
+            for q in MATCH_QUERIES: engine.find_matches(q)
+            return len(MATCH_QUERIES)
+
+        engine = SmartMatcher(pool)
+
+        def match_only():
+            for q in MATCH_QUERIES: engine.find_matches(q)
+            return len(MATCH_QUERIES)
+
+        results["smartmatcher"][str(n)] = {
+            "find_matches": bench(match_only, min_time, repeat),
+            "index_and_find_matches": bench(build_and_match, min_time, repeat),
+        }
+    return results
@@ -0,0 +1,50 @@
+"""
+Re-record the fixtures from the live sites (needs network + Chromium):
+
+    python -m benchmarks.record_fixtures --query milk
+
+Each retailer's search page is rendered through the shared browser pool,
+exactly like a scrape, and saved over benchmarks/fixtures/<retailer>_search.html.
+The committed fixtures are synthetic stand-ins with the adapters' markup;
+recorded pages make the numbers closer to production.
+"""
+import argparse
+import asyncio
+import os
+from browser_pool import pool
+from page_readiness import wait_until_ready
+from retailer_adapters import get_adapter
+from benchmarks.standin_server import FIXTURE_DIR, FIXTURES
+
+
+async def record(query: str, names=None):
+    await pool.start()
+    try:
+        for name, (_, filename) in FIXTURES.items():
+            if names and name not in names: continue
+            adapter = get_adapter(name)
+            try:
+                async with pool.page() as page:
+                    await page.goto(adapter.build_url(query), timeout=30000, wait_until="domcontentloaded")
+                    ready = await wait_until_ready(page, name, adapter.selectors["product_card"], timeout=15)
+                    html = await page.content()
+            except Exception as e:
+                print(f"⚠️ {name}: {e}")
+                continue
+            total, cards = adapter.parse_html(html)
+            if ready.blocked or not cards:
+                print(f"⚠️ {name}: {ready.outcome} ({ready.title}), {total} cards - not saved")
+                continue
+            with open(os.path.join(FIXTURE_DIR, filename), "w", encoding="utf-8") as f:
+                f.write(html)
+            print(f"💾 {name}: {total} cards -> {filename}")
+    finally:
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record retailer search pages as benchmark fixtures")
+    parser.add_argument("--query", default="milk")
+    parser.add_argument("--retailer", action="append", help="only these (repeatable)")
+    args = parser.parse_args()
+    asyncio.run(record(args.query, args.retailer))
@@ -0,0 +1,72 @@
+"""
+Benchmark runner. From the repo root:
+
+    python -m benchmarks.run                   # micro + e2e, JSON to stdout
+    python -m benchmarks.run --out bench.json  # ... and to a file
+    python -m benchmarks.run --only micro
+
+Results carry the git commit, so runs can be diffed across commits.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline grocery API benchmarks")
+    parser.add_argument("--only", choices=["micro", "e2e"])
+    parser.add_argument("--out", help="also write the JSON here")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per micro-benchmark sample")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--list-size", type=int, default=3)
+    parser.add_argument("--warm-rounds", type=int, default=5)
+    parser.add_argument("--mixed-requests", type=int, default=30)
+    parser.add_argument("--hit-ratio", type=float, default=0.8)
+    parser.add_argument("--latency-ms", type=float, default=50, help="stand-in retailer response time")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own logging")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+    }
+    # The app prints a line per cache hit / scrape: keep stdout for the JSON
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        if args.only in (None, "micro"):
+            from benchmarks.micro import run_micro
+            results["micro"] = run_micro(min_time=args.min_time)
+        if args.only in (None, "e2e"):
+            from benchmarks.e2e import run_e2e
+            results["e2e"] = asyncio.run(run_e2e(
+                concurrency=args.concurrency, list_size=args.list_size, warm_rounds=args.warm_rounds,
+                mixed_requests=args.mixed_requests, hit_ratio=args.hit_ratio, latency=args.latency_ms / 1000,
+            ))
+
+    out = json.dumps(results, indent=2, ensure_ascii=False)
+    print(out)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    sys.stderr.write(f"📊 Benchmarks done ({results['meta']['commit']})\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Local stand-in for the retailer sites: serves the HTML fixtures in
+benchmarks/fixtures/ over plain HTTP, so scrape_all_retailers can run
+without touching the live sites.
+
+Each retailer lives under its own path prefix (http://127.0.0.1:PORT/tops/...),
+and a search only returns the fixture cards whose name contains a query term,
+like the real search pages do.
+
+    python -m benchmarks.standin_server --port 8765 --latency-ms 150
+"""
+import argparse
+import os
+import threading
+import time
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+import lxml.html
+from lxml.cssselect import CSSSelector
+import retailer_adapters
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# retailer -> (path prefix, fixture file)
+FIXTURES = {
+    "Lotus's": ("lotuss", "lotuss_search.html"),
+    "Tops": ("tops", "tops_search.html"),
+    "Makro": ("makro", "makro_search.html"),
+}
+_MARKER = "<!--STANDIN-CARDS-->"
+
+
+class _FixturePage:
+    """A fixture split into a page template and its product cards."""
+
+    def __init__(self, path: str, selectors: dict):
+        root = lxml.html.fromstring(open(path, encoding="utf-8").read())
+        name_sel = CSSSelector(selectors["name"])
+        self.cards: List[Tuple[str, str]] = []  # (lowercase name, card html)
+        parent = None
+        taken = set()
+        for card in CSSSelector(selectors["product_card"])(root):
+            if any(a in taken for a in card.iterancestors()): continue  # nested match, already inside a card
+            taken.add(card)
+            name_el = name_sel(card)
+            name = name_el[0].text_content() if name_el else card.text_content()
+            card.tail = None
+            self.cards.append((" ".join(name.lower().split()), lxml.html.tostring(card, encoding="unicode")))
+            parent = card.getparent()
+            parent.remove(card)
+        if parent is not None:
+            parent.append(lxml.html.HtmlComment(_MARKER[4:-3]))
+        self.template = "<!DOCTYPE html>\n" + lxml.html.tostring(root, encoding="unicode")
+
+    def render(self, query: str) -> str:
+        terms = [t for t in query.lower().split() if t]
+        hits = [html for name, html in self.cards if any(t in name for t in terms)]
+        return self.template.replace(_MARKER, "".join(hits))
+
+
+def _query_from(url: str) -> str:
+    parts = urlsplit(url)
+    qs = parse_qs(parts.query)
+    if qs.get("q"): return qs["q"][0]
+    return unquote(parts.path.rstrip("/").rsplit("/", 1)[-1])
+
+
+def make_handler(pages: Dict[str, _FixturePage], latency: float = 0.0, jitter: float = 0.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            prefix = self.path.lstrip("/").split("/", 1)[0].split("?", 1)[0]
+            page = pages.get(prefix)
+            if page is None:
+                self.send_error(404)
+                return
+            if latency or jitter:
+                time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            body = page.render(_query_from(self.path)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # quiet: benchmarks print their own summary
+
+    return Handler
+
+
+def start_server(port: int = 0, latency: float = 0.0, jitter: float = 0.0) -> Tuple[ThreadingHTTPServer, Dict[str, str]]:
+    """
+    Start the stand-in in a daemon thread. Returns (server, {retailer: base_url}).
+    latency / jitter are seconds added to every response (network + site time).
+    """
+    pages = {}
+    for name, (prefix, filename) in FIXTURES.items():
+        pages[prefix] = _FixturePage(os.path.join(FIXTURE_DIR, filename), retailer_adapters.get_adapter(name).selectors)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(pages, latency, jitter))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="standin-server").start()
+    host, real_port = server.server_address[:2]
+    base_urls = {name: f"http://{host}:{real_port}/{prefix}" for name, (prefix, _) in FIXTURES.items()}
+    return server, base_urls
+
+
+def point_adapters(base_urls: Dict[str, str]):
+    """Send every retailer to the stand-in, over plain HTTP (no browser)."""
+    for name, url in base_urls.items():
+        retailer_adapters.set_base_url(name, url)
+        retailer_adapters.set_fetch_mode(name, retailer_adapters.FETCH_HTTP)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded retailer pages locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    args = parser.parse_args()
+    server, urls = start_server(args.port, args.latency_ms / 1000, args.jitter_ms / 1000)
+    print("🧪 Stand-in retailers running. Point the API at them with:")
+    print(f'   RETAILER_FETCH_MODES="{",".join(f"{n}=http" for n in urls)}" \\')
+    print(f'   RETAILER_BASE_URLS="{",".join(f"{n}={u}" for n, u in urls.items())}"')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
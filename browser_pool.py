@@ -0,0 +1,359 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from playwright.async_api import async_playwright
+import metrics
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-accelerated-2d-canvas",
+    "--no-first-run",
+    "--no-zygote",
+    "--disable-gpu",
+    "--hide-scrollbars",
+    "--mute-audio",
+    "--ignore-certificate-errors",
+    "--window-size=1920,1080"
+]
+
+HEADLESS = True
+
+# Pool sizing (override via env on Render / small instances)
+POOL_BROWSERS = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+POOL_CONTEXTS_PER_BROWSER = int(os.getenv("BROWSER_POOL_CONTEXTS", "3"))
+POOL_MAX_PAGES_PER_BROWSER = int(os.getenv("BROWSER_POOL_MAX_PAGES", "200"))
+POOL_MAX_RSS_MB = int(os.getenv("BROWSER_POOL_MAX_RSS_MB", "0"))  # 0 = no RSS limit
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_POOL_ACQUIRE_TIMEOUT", "30"))
+
+RSS_CHECK_INTERVAL = 10.0  # seconds between /proc scans
+RESTART_ATTEMPTS = 3
+
+
+def _process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """
+    Total RSS (MB) of every process below root_pid (Playwright driver + Chromium).
+    Linux only; returns None where /proc is unavailable.
+    """
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children = {}
+    rss = {}
+    for e in entries:
+        if not e.isdigit(): continue
+        try:
+            with open(f"/proc/{e}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            pid = int(e)
+            children.setdefault(int(fields[1]), []).append(pid)
+            rss[pid] = int(fields[21]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+
+    total = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total / (1024 * 1024)
+
+
+async def _new_context(browser):
+    context = await browser.new_context(
+        user_agent=USER_AGENT,
+        viewport={"width": 1920, "height": 1080},
+        locale="th-TH",
+        ignore_https_errors=True,
+        java_script_enabled=True
+    )
+
+    await context.set_extra_http_headers({
+        "Accept-Language": "en-US,en;q=0.9,th;q=0.8",
+        "Referer": "https://www.google.com/",
+        "Upgrade-Insecure-Requests": "1"
+    })
+
+    # Block heavy resources
+    await context.route("**/*", lambda route, request: route.abort() if request.resource_type in ["image", "media", "font"] else route.continue_())
+    await context.add_init_script("Object.defineProperty(navigator, 'webdriver', { get: () => undefined });")
+    return context
+
+
+class _BrowserSlot:
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.generation = 0
+        self.pages_served = 0
+        self.in_use = 0
+        self.draining = False
+        self.restarting = False
+        self.dead = False
+        self.launched_at = 0.0
+
+
+# ==========================================
+# 🌐 LONG-LIVED BROWSER POOL
+# ==========================================
+class BrowserPool:
+    """
+    Keeps Chromium running between scrapes.
+    Each browser owns a fixed number of warm contexts; a page is opened in an idle
+    context and closed on release. Browsers are recycled after N pages or when the
+    Chromium process tree passes the RSS limit, and restarted if they crash.
+    """
+
+    def __init__(self, browsers: int = POOL_BROWSERS, contexts_per_browser: int = POOL_CONTEXTS_PER_BROWSER,
+                 max_pages_per_browser: int = POOL_MAX_PAGES_PER_BROWSER, max_rss_mb: int = POOL_MAX_RSS_MB,
+                 acquire_timeout: float = POOL_ACQUIRE_TIMEOUT):
+        self.browsers = max(1, browsers)
+        self.contexts_per_browser = max(1, contexts_per_browser)
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_rss_mb = max_rss_mb
+        self.acquire_timeout = acquire_timeout
+
+        self._pw = None
+        self._slots = []
+        self._idle = None
+        self._lock = asyncio.Lock()
+        self._started = False
+        self._closing = False
+        self._bg_tasks = set()
+
+        self._last_rss_check = 0.0
+        self._last_rss_mb = None
+        self._launches = 0
+        self._crashes = 0
+        self._recycles = 0
+        self._pages_served = 0
+        self._waiting = 0
+        self._acquire_wait_total = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    async def start(self):
+        async with self._lock:
+            if self._started: return
+            self._closing = False
+            self._idle = asyncio.Queue()
+            self._pw = await async_playwright().start()
+            self._slots = [_BrowserSlot(i) for i in range(self.browsers)]
+            try:
+                for slot in self._slots:
+                    await self._launch(slot)
+            except BaseException:
+                # Don't leave a driver / half the browsers behind: the next page() retries from scratch
+                self._closing = True
+                for slot in self._slots:
+                    await self._close_browser(slot)
+                try:
+                    await self._pw.stop()
+                except Exception:
+                    pass
+                self._pw = None
+                self._slots = []
+                raise
+            self._started = True
+            print(f"🌐 Browser pool ready: {self.browsers} browser(s) x {self.contexts_per_browser} context(s)")
+
+    async def stop(self):
+        async with self._lock:
+            if not self._started: return
+            self._closing = True
+            self._started = False
+            for task in list(self._bg_tasks):
+                task.cancel()
+            for slot in self._slots:
+                await self._close_browser(slot)
+            self._slots = []
+            try:
+                await self._pw.stop()
+            except Exception:
+                pass
+            self._pw = None
+            print("🌐 Browser pool stopped")
+
+    # ----------------------------------------
+    # 🔁 LIFECYCLE
+    # ----------------------------------------
+    async def _launch(self, slot: _BrowserSlot):
+        browser = await self._pw.chromium.launch(headless=HEADLESS, args=BROWSER_ARGS)
+        slot.generation += 1
+        slot.browser = browser
+        slot.pages_served = 0
+        slot.draining = False
+        slot.dead = False
+        slot.launched_at = time.time()
+        self._launches += 1
+
+        gen = slot.generation
+        browser.on("disconnected", lambda _b: self._on_disconnected(slot, gen))
+
+        for _ in range(self.contexts_per_browser):
+            context = await _new_context(browser)
+            self._idle.put_nowait((slot, gen, context))
+
+    async def _close_browser(self, slot: _BrowserSlot):
+        if slot.browser is None: return
+        try:
+            await slot.browser.close()
+        except Exception:
+            pass
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+
+    def _on_disconnected(self, slot: _BrowserSlot, gen: int):
+        if self._closing or slot.generation != gen or slot.restarting: return
+        print(f"💥 Browser #{slot.index} crashed/disconnected, restarting...")
+        self._crashes += 1
+        slot.draining = True
+        # Pages on a dead browser fail on their own; no point waiting for them
+        self._spawn(self._restart(slot, gen))
+
+    def _maybe_recycle(self, slot: _BrowserSlot, gen: int):
+        if slot.generation == gen and slot.draining and slot.in_use == 0 and not slot.restarting:
+            self._recycles += 1
+            self._spawn(self._restart(slot, gen))
+
+    async def _restart(self, slot: _BrowserSlot, gen: int):
+        if slot.generation != gen or slot.restarting or self._closing: return
+        slot.restarting = True
+        try:
+            await self._close_browser(slot)
+            for attempt in range(RESTART_ATTEMPTS):
+                try:
+                    await self._launch(slot)
+                    return
+                except Exception as e:
+                    print(f"⚠️ Browser #{slot.index} relaunch failed ({attempt + 1}/{RESTART_ATTEMPTS}): {e}")
+                    await asyncio.sleep(2 ** attempt)
+            slot.dead = True
+            print(f"❌ Browser #{slot.index} could not be restarted")
+        finally:
+            slot.restarting = False
+
+    def _needs_recycle(self, slot: _BrowserSlot) -> bool:
+        if not slot.browser.is_connected():
+            return True
+        if self.max_pages_per_browser and slot.pages_served >= self.max_pages_per_browser:
+            return True
+        if self.max_rss_mb:
+            now = time.monotonic()
+            if now - self._last_rss_check >= RSS_CHECK_INTERVAL:
+                self._last_rss_check = now
+                self._last_rss_mb = _process_tree_rss_mb(os.getpid())
+                if self._last_rss_mb is not None and self._last_rss_mb > self.max_rss_mb:
+                    print(f"🧹 Chromium RSS {self._last_rss_mb:.0f}MB > {self.max_rss_mb}MB, recycling browser #{slot.index}")
+                    return True
+        return False
+
+    # ----------------------------------------
+    # 📄 PAGE CHECKOUT
+    # ----------------------------------------
+    async def _acquire(self):
+        while True:
+            slot, gen, context = await self._idle.get()
+            if slot.generation == gen and not slot.draining:
+                return slot, gen, context
+            # Stale context from a recycled/crashed browser: drop it
+            self._maybe_recycle(slot, gen)
+
+    @asynccontextmanager
+    async def page(self):
+        """
+        Usage:
+            async with pool.page() as page:
+                await page.goto(...)
+        """
+        if not self._started:
+            await self.start()
+
+        t0 = time.perf_counter()
+        self._waiting += 1
+        try:
+            with metrics.stage("browser_acquire"):
+                slot, gen, context = await asyncio.wait_for(self._acquire(), timeout=self.acquire_timeout)
+        finally:
+            self._waiting -= 1
+        self._acquire_wait_total += time.perf_counter() - t0
+
+        slot.in_use += 1
+        page = None
+        try:
+            page = await context.new_page()
+            yield page
+        finally:
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+            slot.in_use -= 1
+            slot.pages_served += 1
+            self._pages_served += 1
+
+            if slot.generation == gen and not slot.draining and self._needs_recycle(slot):
+                slot.draining = True
+
+            if slot.generation == gen and not slot.draining:
+                self._idle.put_nowait((slot, gen, context))
+            else:
+                self._maybe_recycle(slot, gen)
+
+    # ----------------------------------------
+    # 📊 STATS
+    # ----------------------------------------
+    def stats(self) -> dict:
+        return {
+            "started": self._started,
+            "browsers": [
+                {
+                    "index": s.index,
+                    "generation": s.generation,
+                    "connected": bool(s.browser and s.browser.is_connected()),
+                    "pages_served": s.pages_served,
+                    "in_use": s.in_use,
+                    "draining": s.draining,
+                    "dead": s.dead,
+                    "uptime_seconds": round(time.time() - s.launched_at, 1) if s.launched_at else 0,
+                }
+                for s in self._slots
+            ],
+            "contexts_per_browser": self.contexts_per_browser,
+            "idle_contexts": self._idle.qsize() if self._idle else 0,
+            "waiting": self._waiting,
+            "pages_served": self._pages_served,
+            "launches": self._launches,
+            "crashes": self._crashes,
+            "recycles": self._recycles,
+            "avg_acquire_wait_ms": round(1000 * self._acquire_wait_total / self._pages_served, 1) if self._pages_served else 0.0,
+            "rss_mb": round(self._last_rss_mb, 1) if self._last_rss_mb is not None else None,
+            "max_rss_mb": self.max_rss_mb or None,
+            "max_pages_per_browser": self.max_pages_per_browser,
+        }
+
+
+# Shared instance (started/stopped by grocery_api lifecycle)
+pool = BrowserPool()
+
+metrics.Gauge("browser_pages_in_use", "Pages open in the browser pool.", fn=lambda: sum(s.in_use for s in pool._slots))
+metrics.Gauge("browser_pool_waiting", "Scrapes waiting for a browser context.", fn=lambda: pool._waiting)
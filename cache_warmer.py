@@ -0,0 +1,135 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, List, Set
+import database
+import job_queue
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+WARM_ENABLED = os.getenv("WARM_ENABLED", "1") == "1"
+WARM_TOP_N = int(os.getenv("WARM_TOP_N", "50"))                        # head of the query distribution
+WARM_BUDGET_PER_HOUR = int(os.getenv("WARM_BUDGET_PER_HOUR", "30"))    # max warm scrapes per rolling hour
+WARM_LEAD_SECONDS = int(os.getenv("WARM_LEAD_SECONDS", "1800"))        # re-scrape this long before soft expiry
+WARM_MIN_HITS = int(os.getenv("WARM_MIN_HITS", "2"))
+# Local-time hours with no warming, "start-end" (end exclusive), comma separated
+WARM_PEAK_HOURS = os.getenv("WARM_PEAK_HOURS", "11-13,17-20")
+WARM_INTERVAL_SECONDS = 300
+WARM_LOOKBACK_SECONDS = 3600*24*3   # only items someone asked for in the last 3 days
+HITS_DECAY_INTERVAL = 3600*24       # halve hit counters once a day
+
+
+def parse_hours(spec: str) -> Set[int]:
+    """
+    "11-13,17-20" -> {11, 12, 17, 18, 19}. A range may wrap midnight ("22-2").
+    """
+    hours = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part: continue
+        try:
+            if "-" in part:
+                start, end = (int(x) % 24 for x in part.split("-", 1))
+                h = start
+                while h != end:
+                    hours.add(h)
+                    h = (h + 1) % 24
+            else:
+                hours.add(int(part) % 24)
+        except ValueError:
+            print(f"⚠️ WARM: Ignoring bad peak hours '{part}'")
+    return hours
+
+
+class CacheWarmer:
+    """
+    Re-scrapes the most requested items shortly before they go stale, so the
+    popular ones are (almost) always a fresh cache hit. Work goes through the
+    job queue at PRIORITY_WARM, so user and prime jobs always run first.
+    """
+
+    def __init__(self, submit: Callable[[List[str], int], Awaitable], soft_ttl: float,
+                 top_n: int = WARM_TOP_N, budget_per_hour: int = WARM_BUDGET_PER_HOUR,
+                 lead_seconds: float = WARM_LEAD_SECONDS, peak_hours: str = WARM_PEAK_HOURS):
+        self.submit = submit
+        self.soft_ttl = soft_ttl
+        self.top_n = top_n
+        self.budget_per_hour = budget_per_hour
+        self.lead_seconds = lead_seconds
+        self.peak_hours = parse_hours(peak_hours)
+        self._spent = deque()  # enqueue times in the last hour
+        self._task = None
+        self._last_decay = time.time()
+        self.warmed = 0
+        self.skipped_peak = 0
+        self.skipped_budget = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def in_peak(self, now: float = None) -> bool:
+        return time.localtime(now).tm_hour in self.peak_hours
+
+    def budget_left(self, now: float = None) -> int:
+        now = now or time.time()
+        while self._spent and self._spent[0] <= now - 3600:
+            self._spent.popleft()
+        return max(0, self.budget_per_hour - len(self._spent))
+
+    def _due(self, now: float) -> List[str]:
+        """Popular items that go stale within lead_seconds (blocking, DB thread)."""
+        popular = database.popular_queries(self.top_n, now - WARM_LOOKBACK_SECONDS)
+        due = [q for q, hits, ts in popular
+               if hits >= WARM_MIN_HITS and now - ts >= self.soft_ttl - self.lead_seconds]
+        busy = job_queue.active_queries(due)
+        return [q for q in due if q not in busy]
+
+    async def tick(self) -> int:
+        """One scheduling pass. Returns how many items were queued."""
+        now = time.time()
+        if self.in_peak(now):
+            self.skipped_peak += 1
+            return 0
+        left = self.budget_left(now)
+        if left <= 0:
+            self.skipped_budget += 1
+            return 0
+        due = (await database.run_db(self._due, now))[:left]
+        if not due: return 0
+        await self.submit(due, job_queue.PRIORITY_WARM)
+        self._spent.extend([now] * len(due))
+        self.warmed += len(due)
+        print(f"🔥 WARM: Queued {len(due)} popular items before they go stale")
+        return len(due)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(WARM_INTERVAL_SECONDS)
+            try:
+                await self.tick()
+                if time.time() - self._last_decay >= HITS_DECAY_INTERVAL:
+                    await database.run_db(database.decay_hits)
+                    self._last_decay = time.time()
+            except Exception as e:
+                print(f"⚠️ WARM Error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "top_n": self.top_n,
+            "budget_per_hour": self.budget_per_hour,
+            "budget_left": self.budget_left(),
+            "in_peak": self.in_peak(),
+            "warmed": self.warmed,
+            "skipped_peak": self.skipped_peak,
+            "skipped_budget": self.skipped_budget,
+        }
@@ -0,0 +1,150 @@
+import os
+import re
+import sqlite3
+import time
+from typing import List
+import database
+from products import Product
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+# Catalog rows younger than this can answer a query without scraping
+CATALOG_MAX_AGE_SECONDS = int(os.getenv("CATALOG_MAX_AGE_SECONDS", str(3600*2)))   # 2 Hours
+CATALOG_RETENTION_SECONDS = int(os.getenv("CATALOG_RETENTION_SECONDS", str(3600*24*14)))  # 14 Days
+# "Enough coverage" = matches from at least this many retailers
+CATALOG_MIN_RETAILERS = int(os.getenv("CATALOG_MIN_RETAILERS", "2"))
+CATALOG_MIN_PRODUCTS = int(os.getenv("CATALOG_MIN_PRODUCTS", "3"))
+CATALOG_LOOKUP_LIMIT = 200
+
+# trigram handles Thai (no spaces between words) and substrings ("milk" in "freshmilk");
+# older SQLite builds fall back to unicode61 prefix matching
+_tokenizer = None
+
+# ==========================================
+# 🗄️ SCHEMA
+# ==========================================
+def init_catalog():
+    global _tokenizer
+    with database.connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS product_catalog (
+                id INTEGER PRIMARY KEY,
+                retailer TEXT NOT NULL,
+                name TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                quantity TEXT,
+                base_qty REAL,
+                base_unit TEXT,
+                price REAL,
+                unit_price REAL,
+                last_seen REAL,
+                UNIQUE (retailer, name_key)
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_catalog_last_seen ON product_catalog (last_seen)")
+        try:
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS product_catalog_fts
+                USING fts5(name, content='product_catalog', content_rowid='id', tokenize='trigram')
+            ''')
+        except sqlite3.OperationalError:
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS product_catalog_fts
+                USING fts5(name, content='product_catalog', content_rowid='id')
+            ''')
+        # Keep the FTS index in step with the table
+        conn.executescript('''
+            CREATE TRIGGER IF NOT EXISTS product_catalog_ai AFTER INSERT ON product_catalog BEGIN
+                INSERT INTO product_catalog_fts (rowid, name) VALUES (new.id, new.name);
+            END;
+            CREATE TRIGGER IF NOT EXISTS product_catalog_ad AFTER DELETE ON product_catalog BEGIN
+                INSERT INTO product_catalog_fts (product_catalog_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END;
+            CREATE TRIGGER IF NOT EXISTS product_catalog_au AFTER UPDATE OF name ON product_catalog BEGIN
+                INSERT INTO product_catalog_fts (product_catalog_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO product_catalog_fts (rowid, name) VALUES (new.id, new.name);
+            END;
+        ''')
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'product_catalog_fts'").fetchone()
+        _tokenizer = "trigram" if row and "trigram" in row[0] else "unicode61"
+        conn.commit()
+
+# ==========================================
+# ✍️ INGEST
+# ==========================================
+def upsert_products(products: List[Product]):
+    """
+    Every scraped product lands here, whatever query found it.
+    """
+    if not products: return
+    now = time.time()
+    rows = [
+        (p.retailer, p.name, database.normalize_query(p.name), p.quantity, p.base_qty, p.base_unit, p.price, p.unit_price, now)
+        for p in products if p.name
+    ]
+    try:
+        with database.connection() as conn:
+            conn.executemany('''
+                INSERT INTO product_catalog (retailer, name, name_key, quantity, base_qty, base_unit, price, unit_price, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (retailer, name_key) DO UPDATE SET
+                    name = excluded.name, quantity = excluded.quantity, base_qty = excluded.base_qty,
+                    base_unit = excluded.base_unit, price = excluded.price, unit_price = excluded.unit_price,
+                    last_seen = excluded.last_seen
+            ''', rows)
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ Catalog Write Error: {e}")
+
+# ==========================================
+# 🔎 LOOKUP
+# ==========================================
+def _match_expression(query: str) -> str:
+    """
+    FTS5 query: every term must appear. Terms are quoted (no FTS syntax injection).
+    """
+    terms = [t for t in re.split(r"\s+", database.normalize_query(query)) if t]
+    if _tokenizer == "trigram":
+        terms = [t for t in terms if len(t) >= 3]  # trigram can't match shorter terms
+        return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+    return " AND ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+def lookup(query: str, max_age_seconds: int = CATALOG_MAX_AGE_SECONDS, limit: int = CATALOG_LOOKUP_LIMIT) -> List[Product]:
+    """
+    Fresh catalog products whose name matches the query terms, best match
+    (bm25) first, so the LIMIT keeps the most relevant rows.
+    """
+    expr = _match_expression(query)
+    if not expr: return []
+    try:
+        with database.connection() as conn:
+            rows = conn.execute('''
+                SELECT c.retailer, c.name, c.price, c.unit_price, c.base_qty, c.base_unit, c.quantity
+                FROM product_catalog_fts f JOIN product_catalog c ON c.id = f.rowid
+                WHERE product_catalog_fts MATCH ? AND c.last_seen >= ?
+                ORDER BY f.rank, c.last_seen DESC
+                LIMIT ?
+            ''', (expr, time.time() - max_age_seconds, limit)).fetchall()
+    except Exception as e:
+        print(f"⚠️ Catalog Read Error: {e}")
+        return []
+    return [
+        Product(retailer=r[0], name=r[1], price=r[2], unit_price=r[3], base_qty=r[4], base_unit=r[5], quantity=r[6] or "")
+        for r in rows
+    ]
+
+def has_coverage(products: List[Product]) -> bool:
+    """Enough retailers / products to answer without a fresh scrape?"""
+    return (len(products) >= CATALOG_MIN_PRODUCTS
+            and len({p.retailer for p in products}) >= CATALOG_MIN_RETAILERS)
+
+def prune_catalog(max_age_seconds: int = CATALOG_RETENTION_SECONDS) -> int:
+    try:
+        with database.connection() as conn:
+            cur = conn.execute("DELETE FROM product_catalog WHERE last_seen < ?", (time.time() - max_age_seconds,))
+            conn.commit()
+            return cur.rowcount
+    except Exception as e:
+        print(f"⚠️ Catalog Prune Error: {e}")
+    return 0
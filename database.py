@@ -1,54 +1,687 @@
+import asyncio
+import hashlib
+import os
+import queue
+import re
 import sqlite3
 import json
+import threading
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from memory_cache import MemoryCache
 
 DB_NAME = "grocery_cache.db"
 
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+CACHE_MAX_ROWS = int(os.getenv("CACHE_MAX_ROWS", "5000"))
+CACHE_MAX_AGE_SECONDS = int(os.getenv("CACHE_MAX_AGE_SECONDS", str(3600*24*7)))  # 7 Days
+WRITE_BATCH_WINDOW = 0.05       # seconds to collect writes into one transaction
+# Read bookkeeping (last_access / hit counts) is kept in memory and written at most this often
+# (or along with the next cache write), so serving hot items never waits on disk
+ACCESS_FLUSH_INTERVAL = float(os.getenv("ACCESS_FLUSH_INTERVAL_SECONDS", "60"))
+MAINTENANCE_INTERVAL = 600      # evict every 10 min
+VACUUM_INTERVAL = 3600*24       # reclaim file space once a day
+# Memory tier TTL: keep in line with the API's hard TTL (CACHE_HARD_TTL_SECONDS)
+MEMORY_CACHE_TTL_SECONDS = int(os.getenv("MEMORY_CACHE_TTL_SECONDS", os.getenv("CACHE_HARD_TTL_SECONDS", str(3600*24))))
+
+# Stored payloads: MAGIC + zlib(compact JSON). Rows without the prefix are legacy JSON TEXT.
+PAYLOAD_MAGIC = b"Z1"
+PAYLOAD_COMPRESS_LEVEL = 6
+MIGRATE_BATCH_SIZE = 500
+
+def normalize_query(query: str) -> str:
+    """
+    Cache / dedup key: "  Fresh  Milk " and "fresh milk" are the same item.
+    """
+    return re.sub(r"\s+", " ", (query or "")).strip().lower()
+
+# ==========================================
+# 🔌 CONNECTION POOL (WAL, reused connections)
+# ==========================================
+class _ConnectionPool:
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create: self._created += 1
+            try:
+                conn = self._connect() if can_create else self._idle.get()
+            except Exception:
+                if can_create:
+                    with self._lock: self._created -= 1
+                raise
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+_pool: Optional[_ConnectionPool] = None
+_pool_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+def _connection():
+    global _pool
+    with _pool_lock:
+        # DB_NAME can be repointed (benchmarks / tests): follow it
+        if _pool is None or _pool.path != DB_NAME:
+            if _pool is not None:
+                _pool.close_all()
+                memory.clear()
+            _pool = _ConnectionPool(DB_NAME, DB_POOL_SIZE)
+        pool = _pool
+    return pool.connection()
+
+def connection():
+    """
+    Pooled connection (context manager) for other modules that keep
+    their tables in the cache DB.
+    """
+    return _connection()
+
+async def run_db(fn, *args):
+    """
+    Run a blocking DB function on the DB thread pool (keeps the event loop free).
+    """
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+def close():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+# Hot entries, already decoded (no disk I/O, no json.loads)
+memory = MemoryCache(ttl_seconds=MEMORY_CACHE_TTL_SECONDS)
+
+# ==========================================
+# 📦 PAYLOAD FORMAT
+# ==========================================
+def dumps(data) -> bytes:
+    """Canonical JSON bytes for a payload (what digests are taken over)."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def content_digest(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+def encode_payload(raw: bytes) -> bytes:
+    return PAYLOAD_MAGIC + zlib.compress(raw, PAYLOAD_COMPRESS_LEVEL)
+
+def decode_payload(value) -> Tuple[list, bytes]:
+    """(data, raw JSON bytes) from a stored value, compressed BLOB or legacy TEXT."""
+    if isinstance(value, (bytes, memoryview)):
+        value = bytes(value)
+        raw = zlib.decompress(value[len(PAYLOAD_MAGIC):]) if value.startswith(PAYLOAD_MAGIC) else value
+    else:
+        raw = value.encode("utf-8")
+    return json.loads(raw), raw
+
+def data_digest(data: list) -> str:
+    """Digest of a payload that didn't come from a stored row (fresh scrape, pending write)."""
+    return content_digest(dumps(data))
+
+# ==========================================
+# 🗄️ SCHEMA
+# ==========================================
+def _columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Create table if not exists
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS product_cache (
-            query TEXT PRIMARY KEY,
-            data TEXT,
-            timestamp REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with _connection() as conn:
+        c = conn.cursor()
+        # Create table if not exists
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS product_cache (
+                query TEXT PRIMARY KEY,
+                data TEXT,
+                timestamp REAL,
+                last_access REAL,
+                hits INTEGER DEFAULT 0,
+                digest TEXT
+            )
+        ''')
+        # Older DBs: add the LRU / popularity columns in place
+        columns = _columns(conn, "product_cache")
+        if "last_access" not in columns:
+            c.execute("ALTER TABLE product_cache ADD COLUMN last_access REAL")
+        if "hits" not in columns:
+            c.execute("ALTER TABLE product_cache ADD COLUMN hits INTEGER DEFAULT 0")
+        if "digest" not in columns:
+            c.execute("ALTER TABLE product_cache ADD COLUMN digest TEXT")
+        _normalize_keys(conn)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_product_cache_lru ON product_cache (last_access)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_product_cache_ts ON product_cache (timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_product_cache_hits ON product_cache (hits)")
+        # One row per item being scraped right now (shared by all uvicorn workers)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_leases (
+                query TEXT PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL
+            )
+        ''')
+        conn.commit()
+
+def _normalize_keys(conn) -> int:
+    """
+    Rows written before keys were normalized ("Milk", " fresh  milk") move to
+    their normalized key; when spellings collide the newest row wins (hit
+    counts are added up). Returns how many rows were renamed or dropped.
+    """
+    groups: Dict[str, List[Tuple[str, float, int]]] = {}
+    for query, timestamp, hits in conn.execute("SELECT query, timestamp, COALESCE(hits, 0) FROM product_cache"):
+        groups.setdefault(normalize_query(query), []).append((query, timestamp or 0, hits))
+    changed = 0
+    for key, rows in groups.items():
+        if all(query == key for query, _, _ in rows): continue
+        newest = max(rows, key=lambda r: r[1])[0]
+        others = [query for query, _, _ in rows if query != newest]
+        conn.executemany("DELETE FROM product_cache WHERE query = ?", [(q,) for q in others])
+        conn.execute("UPDATE product_cache SET query = ?, hits = ? WHERE query = ?",
+                     (key, sum(h for _, _, h in rows), newest))
+        changed += len(rows)
+    if changed:
+        print(f"🔑 DB: Normalized {changed} legacy cache keys")
+    return changed
+
+# ==========================================
+# 📖 READS
+# ==========================================
+def _from_memory(queries: List[str], max_age_seconds) -> Tuple[Dict[str, Tuple[list, float, str]], List[str]]:
+    """Split normalized keys into memory hits {key: (data, age, digest)} and keys still to read."""
+    out = {}
+    missing = []
+    now = time.time()
+    for key in dict.fromkeys(normalize_query(q) for q in queries if q):
+        hit = memory.get(key, max_age_seconds)
+        if hit is not None:
+            out[key] = (hit[0], now - hit[1], hit[2])
+        else:
+            missing.append(key)
+    return out, missing
+
+def _read_rows(keys: List[str], max_age_seconds) -> Dict[str, Tuple[list, float, str]]:
+    out = {}
+    now = time.time()
+    try:
+        with _connection() as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT query, data, timestamp, digest FROM product_cache WHERE query IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, stored, timestamp, digest in rows:
+                    age = now - timestamp
+                    # Check if expired
+                    if age < max_age_seconds:
+                        try:
+                            data, raw = decode_payload(stored)
+                        except (TypeError, ValueError, zlib.error):
+                            continue  # unreadable row = a miss (migrate_payloads drops legacy ones)
+                        digest = digest or content_digest(raw)
+                        memory.put(key, data, timestamp, len(raw), digest)
+                        out[key] = (data, age, digest)
+    except Exception as e:
+        print(f"⚠️ DB Read Error: {e}")
+    return out
+
+def _shape(out: dict, with_digest: bool) -> dict:
+    return out if with_digest else {key: entry[:2] for key, entry in out.items()}
+
+def _newer_on_disk(ages: Dict[str, float], max_age_seconds) -> Dict[str, Tuple[list, float, str]]:
+    """
+    Memory copies {key: age} that another uvicorn worker may have refreshed:
+    one indexed timestamp read, and only rows newer than our copy are re-read
+    (which also replaces them in the memory tier).
+    """
+    now = time.time()
+    keys = list(ages)
+    newer = []
+    try:
+        with _connection() as conn:
+            rows = conn.execute(
+                f"SELECT query, timestamp FROM product_cache WHERE query IN ({','.join('?' * len(keys))})", keys,
+            ).fetchall()
+    except Exception as e:
+        print(f"⚠️ DB Read Error: {e}")
+        return {}
+    for key, timestamp in rows:
+        if timestamp is not None and timestamp > now - ages[key] + 1:  # 1s slack: ages are rounded through floats
+            newer.append(key)
+    return _read_rows(newer, max_age_seconds) if newer else {}
+
+def get_many(queries: List[str], max_age_seconds=3600, with_digest: bool = False) -> Dict[str, tuple]:
+    """
+    One SELECT for a whole shopping list (memory tier first, only the rest hits disk).
+    Returns {normalized_query: (data, age_seconds)} for entries younger than max_age_seconds;
+    with_digest adds the content digest of exactly that data: (data, age_seconds, digest).
+    """
+    out, missing = _from_memory(queries, max_age_seconds)
+    if missing:
+        out.update(_read_rows(missing, max_age_seconds))
+    return _shape(out, with_digest)
+
+def get_cached_entry(query: str, max_age_seconds=3600):
+    """
+    Like get_cached_data, but also returns how old the entry is:
+    (data, age_seconds), or None if missing / older than max_age_seconds.
+    """
+    return get_many([query], max_age_seconds).get(normalize_query(query))
 
 def get_cached_data(query: str, max_age_seconds=3600):
     """
     Retrieve data from DB if it exists and isn't too old.
     """
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("SELECT data, timestamp FROM product_cache WHERE query = ?", (query,))
-        row = c.fetchone()
-        conn.close()
+    entry = get_cached_entry(query, max_age_seconds)
+    return entry[0] if entry else None
 
-        if row:
-            data_json, timestamp = row
-            # Check if expired
-            if time.time() - timestamp < max_age_seconds:
-                return json.loads(data_json)
+def iter_entries():
+    """
+    Every cached entry as (query, data, timestamp); for rebuilding derived tables.
+    """
+    with _connection() as conn:
+        rows = conn.execute("SELECT query, data, timestamp FROM product_cache").fetchall()
+    for key, stored, timestamp in rows:
+        try:
+            yield key, decode_payload(stored)[0], timestamp
+        except (TypeError, ValueError, zlib.error):
+            continue
+
+def get_cache_timestamp(query: str):
+    """
+    When the item was last written (None if never).
+    """
+    try:
+        with _connection() as conn:
+            row = conn.execute("SELECT timestamp FROM product_cache WHERE query = ?", (normalize_query(query),)).fetchone()
+        return row[0] if row else None
     except Exception as e:
         print(f"⚠️ DB Read Error: {e}")
     return None
 
+# ==========================================
+# ✍️ WRITES
+# ==========================================
+_save_listeners = []
+
+def add_save_listener(fn):
+    """
+    fn(conn, {normalized_query: data}, now) runs inside every cache write's
+    transaction (derived tables stay in step with product_cache, same fsync).
+    A failing listener is rolled back on its own and logged; the write still lands.
+    """
+    _save_listeners.append(fn)
+
+def _notify_listeners(conn, saved: Dict[str, list], now: float):
+    for fn in _save_listeners:
+        conn.execute("SAVEPOINT save_listener")
+        try:
+            fn(conn, saved, now)
+            conn.execute("RELEASE save_listener")
+        except Exception as e:
+            conn.execute("ROLLBACK TO save_listener")
+            conn.execute("RELEASE save_listener")
+            print(f"⚠️ DB Listener Error ({fn.__name__}): {e}")
+
+def save_many(entries: Dict[str, list], touched: List[str] = (), hits: Dict[str, int] = None):
+    """
+    Write several cache entries (and LRU touches / hit counts) in ONE transaction.
+    """
+    now = time.time()
+    raws = [dumps(data) for data in entries.values()]
+    rows = [
+        (normalize_query(q), encode_payload(raw), now, now, content_digest(raw))
+        for q, raw in zip(entries.keys(), raws)
+    ]
+    try:
+        with _connection() as conn:
+            # Insert or Update (keeps the row's hit count)
+            conn.executemany('''
+                INSERT INTO product_cache (query, data, timestamp, last_access, digest) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(query) DO UPDATE SET
+                    data = excluded.data, timestamp = excluded.timestamp,
+                    last_access = excluded.last_access, digest = excluded.digest
+            ''', rows)
+            if touched:
+                conn.executemany("UPDATE product_cache SET last_access = ? WHERE query = ?", [(now, k) for k in touched])
+            if hits:
+                conn.executemany(
+                    "UPDATE product_cache SET hits = COALESCE(hits, 0) + ?, last_access = ? WHERE query = ?",
+                    [(n, now, k) for k, n in hits.items()],
+                )
+            if rows and _save_listeners:
+                _notify_listeners(conn, {key: data for (key, *_), data in zip(rows, entries.values())}, now)
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ DB Write Error: {e}")
+        for key, *_ in rows:
+            memory.invalidate(key)
+        return
+    # Fresh entry replaces whatever the memory tier had for that key
+    for (key, _, _, _, digest), raw, data in zip(rows, raws, entries.values()):
+        memory.invalidate(key)
+        memory.put(key, data, now, len(raw), digest)
+
 def save_to_cache(query: str, data: list):
     """
     Save scraped data to DB.
     """
+    save_many({query: data})
+
+class _WriteBatcher:
+    """
+    Collects writes for WRITE_BATCH_WINDOW and commits them together,
+    so a burst of finished scrapes costs one fsync instead of one each.
+    LRU touches and hit counts ride along with those commits, or get their
+    own one at most every ACCESS_FLUSH_INTERVAL.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, list] = {}
+        self._touched = set()
+        self._hits: Dict[str, int] = {}
+        self._waiters = []
+        self._task = None
+        self._last_access_flush = time.monotonic()
+
+    def pending(self, key: str):
+        return self._pending.get(key)
+
+    def _schedule(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_soon())
+
+    async def save(self, query: str, data: list):
+        self._pending[normalize_query(query)] = data
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._schedule()
+        await fut
+
+    def _schedule_access(self):
+        if time.monotonic() - self._last_access_flush >= ACCESS_FLUSH_INTERVAL:
+            self._schedule()
+
+    def touch(self, keys):
+        self._touched.update(keys)
+        self._schedule_access()
+
+    def hit(self, keys):
+        for key in keys:
+            self._hits[key] = self._hits.get(key, 0) + 1
+        self._schedule_access()
+
+    async def _flush_soon(self):
+        await asyncio.sleep(WRITE_BATCH_WINDOW)
+        await self.flush()
+
+    async def flush(self):
+        self._task = None
+        entries, touched, hits, waiters = self._pending, self._touched, self._hits, self._waiters
+        self._pending, self._touched, self._hits, self._waiters = {}, set(), {}, []
+        if touched or hits:
+            self._last_access_flush = time.monotonic()
+        if entries or touched or hits:
+            await run_db(save_many, entries, list(touched - set(entries) - set(hits)), hits)
+        for fut in waiters:
+            if not fut.done(): fut.set_result(None)
+
+_writer = _WriteBatcher()
+
+async def asave_to_cache(query: str, data: list):
+    """
+    Async save_to_cache: batched with other writes, committed off the event loop.
+    """
+    await _writer.save(query, data)
+
+async def aget_many(queries: List[str], max_age_seconds=3600, with_digest: bool = False,
+                    recheck_age: float = None) -> Dict[str, tuple]:
+    """
+    Async get_many: memory hits are answered on the loop, the rest off the
+    event loop. Also records access time for LRU eviction (written lazily).
+    Memory hits at least `recheck_age` old are checked against the DB first
+    (another worker may have refreshed them), so they aren't served as stale.
+    """
+    out, missing = _from_memory(queries, max_age_seconds)
+    if recheck_age is not None:
+        old = {key: entry[1] for key, entry in out.items() if entry[1] >= recheck_age}
+        if old:
+            out.update(await run_db(_newer_on_disk, old, max_age_seconds))
+    if missing:
+        out.update(await run_db(_read_rows, missing, max_age_seconds))
+    # Read-your-writes: entries still waiting in the write batch
+    for q in queries:
+        key = normalize_query(q)
+        data = _writer.pending(key)
+        if data is not None:
+            out[key] = (data, 0.0, data_digest(data) if with_digest else None)
+    if out:
+        _writer.touch(out.keys())
+    return _shape(out, with_digest)
+
+async def aget_cached_entry(query: str, max_age_seconds=3600):
+    return (await aget_many([query], max_age_seconds)).get(normalize_query(query))
+
+def record_hits(queries: List[str]):
+    """
+    Count user requests per item for popularity-driven warming. Batched with
+    the other writes; only items that have a cache row are counted, so call
+    this after misses have been saved.
+    """
+    _writer.hit(dict.fromkeys(normalize_query(q) for q in queries if q))
+
+def popular_queries(limit: int, since: float) -> List[Tuple[str, int, float]]:
+    """
+    Most requested items accessed since `since`: [(query, hits, timestamp)].
+    """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        # Insert or Replace (Update)
-        c.execute("INSERT OR REPLACE INTO product_cache (query, data, timestamp) VALUES (?, ?, ?)",
-                (query, json.dumps(data), time.time()))
-        conn.commit()
-        conn.close()
+        with _connection() as conn:
+            return conn.execute('''
+                SELECT query, hits, timestamp FROM product_cache
+                WHERE hits > 0 AND last_access >= ?
+                ORDER BY hits DESC LIMIT ?
+            ''', (since, limit)).fetchall()
+    except Exception as e:
+        print(f"⚠️ DB Read Error: {e}")
+    return []
+
+def decay_hits(factor: float = 0.5) -> int:
+    """
+    Age the hit counters so yesterday's favourites don't stay on top forever.
+    """
+    try:
+        with _connection() as conn:
+            cur = conn.execute("UPDATE product_cache SET hits = CAST(hits * ? AS INTEGER) WHERE hits > 0", (factor,))
+            conn.commit()
+            return cur.rowcount
     except Exception as e:
-        print(f"⚠️ DB Write Error: {e}")
\ No newline at end of file
+        print(f"⚠️ DB Write Error: {e}")
+    return 0
+
+async def flush():
+    await _writer.flush()
+
+# ==========================================
+# 🔒 CROSS-WORKER SCRAPE LEASES
+# ==========================================
+def acquire_lease(query: str, owner: str, ttl_seconds: float) -> bool:
+    """
+    Claim the right to scrape `query`. True if we hold the lease
+    (it was free, expired, or already ours).
+    """
+    key = normalize_query(query)
+    now = time.time()
+    try:
+        with _connection() as conn:
+            conn.execute('''
+                INSERT INTO scrape_leases (query, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(query) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE scrape_leases.expires_at < ? OR scrape_leases.owner = excluded.owner
+            ''', (key, owner, now + ttl_seconds, now))
+            conn.commit()
+            row = conn.execute("SELECT owner FROM scrape_leases WHERE query = ?", (key,)).fetchone()
+        return bool(row and row[0] == owner)
+    except Exception as e:
+        print(f"⚠️ DB Lease Error: {e}")
+        return True  # never block scraping on a lease failure
+
+def lease_active(query: str) -> bool:
+    try:
+        with _connection() as conn:
+            row = conn.execute("SELECT expires_at FROM scrape_leases WHERE query = ?", (normalize_query(query),)).fetchone()
+        return bool(row and row[0] > time.time())
+    except Exception as e:
+        print(f"⚠️ DB Lease Error: {e}")
+    return False
+
+def release_lease(query: str, owner: str):
+    try:
+        with _connection() as conn:
+            conn.execute("DELETE FROM scrape_leases WHERE query = ? AND owner = ?", (normalize_query(query), owner))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ DB Lease Error: {e}")
+
+# ==========================================
+# 🧹 BOUNDED SIZE: EVICTION + VACUUM
+# ==========================================
+def evict_cache(max_rows: int = CACHE_MAX_ROWS, max_age_seconds: int = CACHE_MAX_AGE_SECONDS) -> int:
+    """
+    Drop entries older than max_age_seconds, then the least recently used
+    ones until at most max_rows remain. Returns rows deleted.
+    """
+    deleted = 0
+    try:
+        with _connection() as conn:
+            cur = conn.execute("DELETE FROM product_cache WHERE timestamp < ?", (time.time() - max_age_seconds,))
+            deleted += cur.rowcount
+            (count,) = conn.execute("SELECT COUNT(*) FROM product_cache").fetchone()
+            if count > max_rows:
+                cur = conn.execute('''
+                    DELETE FROM product_cache WHERE query IN (
+                        SELECT query FROM product_cache
+                        ORDER BY COALESCE(last_access, timestamp) ASC LIMIT ?
+                    )
+                ''', (count - max_rows,))
+                deleted += cur.rowcount
+            conn.execute("DELETE FROM scrape_leases WHERE expires_at < ?", (time.time(),))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ DB Evict Error: {e}")
+    return deleted
+
+def migrate_payloads(batch_size: int = MIGRATE_BATCH_SIZE) -> int:
+    """
+    Rewrite legacy JSON TEXT rows in the compressed format, a batch at a time.
+    Reads handle both formats, so this can run whenever. Rows that aren't valid
+    JSON can never be served: they're deleted, so they don't fill every batch.
+    Returns rows converted or deleted (0 = nothing left).
+    """
+    try:
+        with _connection() as conn:
+            rows = conn.execute(
+                "SELECT query, data FROM product_cache WHERE typeof(data) = 'text' LIMIT ?", (batch_size,)
+            ).fetchall()
+            updates = []
+            broken = []
+            for key, text in rows:
+                try:
+                    raw = dumps(json.loads(text))
+                except ValueError:
+                    broken.append((key,))
+                    continue
+                updates.append((encode_payload(raw), content_digest(raw), key))
+            conn.executemany("UPDATE product_cache SET data = ?, digest = ? WHERE query = ? AND typeof(data) = 'text'", updates)
+            conn.executemany("DELETE FROM product_cache WHERE query = ? AND typeof(data) = 'text'", broken)
+            conn.commit()
+            if broken:
+                print(f"🗑️ DB: Dropped {len(broken)} unreadable legacy cache entries")
+            return len(updates) + len(broken)
+    except Exception as e:
+        print(f"⚠️ DB Migrate Error: {e}")
+    return 0
+
+def vacuum():
+    """
+    Give freed pages back to the filesystem and trim the WAL.
+    """
+    try:
+        with _connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+    except Exception as e:
+        print(f"⚠️ DB Vacuum Error: {e}")
+
+_maintenance_tasks = []
+
+def add_maintenance_task(fn):
+    """
+    Register a blocking cleanup function (no args) to run with each eviction pass.
+    """
+    _maintenance_tasks.append(fn)
+
+async def maintenance_loop():
+    """
+    Runs for the app's lifetime (started from grocery_api startup).
+    """
+    last_vacuum = time.time()
+    migrated = 0
+    while True:
+        n = await run_db(migrate_payloads)
+        migrated += n
+        if n: continue
+        if migrated:
+            print(f"📦 DB: Migrated {migrated} legacy cache entries")
+            migrated = 0
+            await run_db(vacuum)
+            last_vacuum = time.time()
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+        await _writer.flush()  # buffered last_access first, so eviction sees it
+        deleted = await run_db(evict_cache)
+        if deleted:
+            print(f"🧹 DB: Evicted {deleted} cache entries")
+        for fn in _maintenance_tasks:
+            try:
+                await run_db(fn)
+            except Exception as e:
+                print(f"⚠️ DB Maintenance Error ({fn.__name__}): {e}")
+        if time.time() - last_vacuum >= VACUUM_INTERVAL:
+            await run_db(vacuum)
+            last_vacuum = time.time()
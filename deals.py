@@ -0,0 +1,267 @@
+import os
+import time
+from typing import Dict, List, Optional
+import database
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+# A drop is measured against the last different unit price seen within this window
+DEALS_HISTORY_SECONDS = int(os.getenv("DEALS_HISTORY_SECONDS", str(3600*24*30)))  # 30 Days
+# Deals not refreshed for this long leave the ranked lists
+DEALS_MAX_AGE_SECONDS = int(os.getenv("DEALS_MAX_AGE_SECONDS", str(3600*24*7)))   # 7 Days
+DEALS_PAGE_MAX = 200
+
+SORT_DROPS = "drops"        # biggest unit-price drop first (then newest)
+SORT_CHEAPEST = "cheapest"  # lowest unit price first, compared within the same unit (฿/kg vs ฿/kg)
+SORT_SPREAD = "spread"      # items where retailers disagree most, cheapest offer shown
+SORTS = (SORT_DROPS, SORT_CHEAPEST, SORT_SPREAD)
+
+# ==========================================
+# 🗄️ SCHEMA
+# ==========================================
+def init_deals():
+    with database.connection() as conn:
+        conn.executescript('''
+            -- One row per unit-price change of a product
+            CREATE TABLE IF NOT EXISTS price_history (
+                retailer TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                unit_price REAL,
+                price REAL,
+                seen_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history (retailer, name_key, seen_at);
+            CREATE INDEX IF NOT EXISTS idx_price_history_seen ON price_history (seen_at);
+
+            -- The latest best_per_retailer output, one row per (query, retailer)
+            CREATE TABLE IF NOT EXISTS current_deals (
+                query TEXT NOT NULL,
+                retailer TEXT NOT NULL,
+                query_item TEXT,
+                name TEXT,
+                name_key TEXT,
+                price REAL,
+                unit_price REAL,
+                base_unit TEXT,
+                previous_price REAL,
+                previous_unit_price REAL,
+                drop_pct REAL DEFAULT 0,
+                updated_at REAL,
+                PRIMARY KEY (query, retailer)
+            );
+            CREATE INDEX IF NOT EXISTS idx_current_deals_drop ON current_deals (drop_pct DESC, updated_at DESC);
+            DROP INDEX IF EXISTS idx_current_deals_cheapest;
+            CREATE INDEX IF NOT EXISTS idx_current_deals_unit_price ON current_deals (base_unit, unit_price);
+            CREATE INDEX IF NOT EXISTS idx_current_deals_updated ON current_deals (updated_at);
+
+            -- Cross-retailer spread per query (same unit as the cheapest offer only)
+            CREATE TABLE IF NOT EXISTS query_spread (
+                query TEXT PRIMARY KEY,
+                cheapest_retailer TEXT,
+                min_unit_price REAL,
+                max_unit_price REAL,
+                spread_pct REAL,
+                retailers INTEGER,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_query_spread_pct ON query_spread (spread_pct DESC);
+        ''')
+        conn.commit()
+
+# ==========================================
+# ✍️ INCREMENTAL UPDATE (save listener)
+# ==========================================
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _unit_of(row: dict) -> str:
+    # "฿12.50/kg" -> "kg"
+    label = str(row.get("Unit Price", ""))
+    return label.rsplit("/", 1)[1] if "/" in label else "unit"
+
+def _apply(conn, query: str, rows: List[dict], now: float):
+    """Fold one item's new best_per_retailer output into the index."""
+    query = database.normalize_query(query)
+    seen = []
+    for row in rows or []:
+        if not isinstance(row, dict): continue  # malformed / foreign cache payload
+        retailer = row.get("WINNER")
+        name = str(row.get("Product Name", ""))
+        unit_price = _to_float(row.get("_raw_unit_price"))
+        price = _to_float(row.get("_raw_price"))
+        if not retailer or not name or unit_price is None: continue
+        name_key = database.normalize_query(name)
+        seen.append(retailer)
+
+        last = conn.execute(
+            "SELECT unit_price FROM price_history WHERE retailer = ? AND name_key = ? ORDER BY seen_at DESC LIMIT 1",
+            (retailer, name_key),
+        ).fetchone()
+        if last is None or last[0] != unit_price:
+            conn.execute(
+                "INSERT INTO price_history (retailer, name_key, unit_price, price, seen_at) VALUES (?, ?, ?, ?, ?)",
+                (retailer, name_key, unit_price, price, now),
+            )
+        previous = conn.execute('''
+            SELECT price, unit_price FROM price_history
+            WHERE retailer = ? AND name_key = ? AND unit_price != ? AND seen_at >= ?
+            ORDER BY seen_at DESC LIMIT 1
+        ''', (retailer, name_key, unit_price, now - DEALS_HISTORY_SECONDS)).fetchone()
+        prev_price, prev_unit = previous if previous else (None, None)
+        drop_pct = round(100 * (prev_unit - unit_price) / prev_unit, 1) if prev_unit and prev_unit > unit_price else 0.0
+
+        conn.execute('''
+            INSERT INTO current_deals (query, retailer, query_item, name, name_key, price, unit_price, base_unit,
+                                       previous_price, previous_unit_price, drop_pct, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (query, retailer) DO UPDATE SET
+                query_item = excluded.query_item, name = excluded.name, name_key = excluded.name_key,
+                price = excluded.price, unit_price = excluded.unit_price, base_unit = excluded.base_unit,
+                previous_price = excluded.previous_price, previous_unit_price = excluded.previous_unit_price,
+                drop_pct = excluded.drop_pct, updated_at = excluded.updated_at
+        ''', (query, retailer, row.get("query_item") or query, name, name_key, price, unit_price, _unit_of(row),
+              prev_price, prev_unit, drop_pct, now))
+
+    # Retailers that no longer have the item
+    conn.execute(
+        f"DELETE FROM current_deals WHERE query = ? AND retailer NOT IN ({','.join('?' * len(seen))})",
+        (query, *seen),
+    )
+    _update_spread(conn, query, now)
+
+def _update_spread(conn, query: str, now: float):
+    offers = conn.execute(
+        "SELECT retailer, unit_price, base_unit FROM current_deals WHERE query = ? ORDER BY unit_price",
+        (query,),
+    ).fetchall()
+    if not offers:
+        conn.execute("DELETE FROM query_spread WHERE query = ?", (query,))
+        return
+    cheapest_retailer, min_unit, unit = offers[0]
+    comparable = [u for _, u, b in offers if b == unit]
+    max_unit = max(comparable)
+    spread_pct = round(100 * (max_unit - min_unit) / max_unit, 1) if len(comparable) > 1 and max_unit > 0 else 0.0
+    conn.execute('''
+        INSERT INTO query_spread (query, cheapest_retailer, min_unit_price, max_unit_price, spread_pct, retailers, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (query) DO UPDATE SET
+            cheapest_retailer = excluded.cheapest_retailer, min_unit_price = excluded.min_unit_price,
+            max_unit_price = excluded.max_unit_price, spread_pct = excluded.spread_pct,
+            retailers = excluded.retailers, updated_at = excluded.updated_at
+    ''', (query, cheapest_retailer, min_unit, max_unit, spread_pct, len(comparable), now))
+
+def on_save(conn, entries: Dict[str, list], now: float):
+    """database save listener: runs in the same transaction as the cache write."""
+    for query, rows in entries.items():
+        _apply(conn, query, rows, now)
+
+def needs_rebuild() -> bool:
+    """
+    Cache rows but an empty index (first start on a DB from before the index
+    existed), or index rows under pre-normalization keys ("Milk"). Run after
+    database.init_db, which moves the cache rows to normalized keys.
+    """
+    with database.connection() as conn:
+        queries = [q for (q,) in conn.execute("SELECT DISTINCT query FROM current_deals")]
+        if queries:
+            return any(database.normalize_query(q) != q for q in queries)
+        return conn.execute("SELECT 1 FROM product_cache LIMIT 1").fetchone() is not None
+
+def rebuild_index() -> int:
+    """
+    Recompute current deals / spreads from every cached entry (history is kept).
+    A full scan in one write transaction: startup / admin use only, saves keep
+    the index current. Returns how many items were indexed.
+    """
+    count = 0
+    with database.connection() as conn:
+        conn.execute("DELETE FROM current_deals")
+        conn.execute("DELETE FROM query_spread")
+        for query, rows, timestamp in database.iter_entries():
+            _apply(conn, query, rows, timestamp)
+            count += 1
+        conn.commit()
+    return count
+
+def prune_deals(max_age_seconds: int = DEALS_MAX_AGE_SECONDS, history_seconds: int = DEALS_HISTORY_SECONDS) -> int:
+    now = time.time()
+    with database.connection() as conn:
+        deleted = conn.execute("DELETE FROM current_deals WHERE updated_at < ?", (now - max_age_seconds,)).rowcount
+        conn.execute("DELETE FROM query_spread WHERE updated_at < ?", (now - max_age_seconds,))
+        deleted += conn.execute("DELETE FROM price_history WHERE seen_at < ?", (now - history_seconds,)).rowcount
+        conn.commit()
+    return deleted
+
+# ==========================================
+# 🔎 RANKED LISTS (indexed ORDER BY ... LIMIT / OFFSET)
+# ==========================================
+_DEAL_COLUMNS = "d.retailer, d.name, d.price, d.unit_price, d.base_unit, d.previous_price, d.drop_pct, d.query_item, d.updated_at"
+
+def _deal_row(r, extra: dict = None) -> dict:
+    retailer, name, price, unit_price, base_unit, previous_price, drop_pct, query_item, updated_at = r
+    is_promo = bool(drop_pct and drop_pct > 0)
+    out = {
+        "WINNER": retailer,
+        "Product Name": name,
+        "Product Type": "",
+        "Best Price": f"฿{price:.2f}" if price is not None else "",
+        "Unit Price": f"฿{unit_price:.2f}/{base_unit}",
+        "_raw_price": price,
+        "_raw_unit_price": unit_price,
+        "is_promo": is_promo,
+        "original_price": previous_price if is_promo else None,
+        "drop_pct": drop_pct or 0.0,
+        "query_item": query_item,
+    }
+    if extra: out.update(extra)
+    return out
+
+def ranked(sort: str = SORT_DROPS, query: str = None, limit: int = 50, offset: int = 0, unit: str = None) -> List[dict]:
+    """
+    One page of a ranked list, in the /api/compare row shape. `query` narrows
+    it to one shopping-list item (normalized, exact), `unit` to one base unit.
+    "cheapest" without a unit interleaves the units (cheapest per kg, per L,
+    ... then the second cheapest of each) instead of comparing ฿/egg to ฿/kg.
+    """
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    limit = max(1, min(limit, DEALS_PAGE_MAX))
+    offset = max(0, offset)
+    key = database.normalize_query(query) if query else None
+    conds, args = [], []
+    if key:
+        conds.append("d.query = ?"); args.append(key)
+    if unit:
+        conds.append("d.base_unit = ?"); args.append(unit)
+    where = ("WHERE " + " AND ".join(conds)) if conds else ""
+    with database.connection() as conn:
+        if sort == SORT_SPREAD:
+            qconds = ["s.query = ?"] if key else ["s.retailers > 1"]
+            if unit: qconds.append("d.base_unit = ?")
+            rows = conn.execute(f'''
+                SELECT {_DEAL_COLUMNS}, s.spread_pct, s.max_unit_price
+                FROM query_spread s JOIN current_deals d ON d.query = s.query AND d.retailer = s.cheapest_retailer
+                WHERE {" AND ".join(qconds)}
+                ORDER BY s.spread_pct DESC LIMIT ? OFFSET ?
+            ''', [*args, limit, offset]).fetchall()
+            return [_deal_row(r[:9], {"spread_pct": r[9], "max_unit_price": r[10]}) for r in rows]
+        if sort == SORT_CHEAPEST and not unit:
+            # Rank inside each unit (walks idx_current_deals_unit_price), then interleave
+            rows = conn.execute(f'''
+                SELECT {_DEAL_COLUMNS} FROM (
+                    SELECT d.*, ROW_NUMBER() OVER (PARTITION BY d.base_unit ORDER BY d.unit_price) AS unit_rank
+                    FROM current_deals d {where}
+                ) d
+                ORDER BY d.unit_rank, d.base_unit LIMIT ? OFFSET ?
+            ''', [*args, limit, offset]).fetchall()
+            return [_deal_row(r) for r in rows]
+        order = "d.drop_pct DESC, d.updated_at DESC" if sort == SORT_DROPS else "d.unit_price ASC"
+        rows = conn.execute(f'''
+            SELECT {_DEAL_COLUMNS} FROM current_deals d {where}
+            ORDER BY {order} LIMIT ? OFFSET ?
+        ''', [*args, limit, offset]).fetchall()
+    return [_deal_row(r) for r in rows]
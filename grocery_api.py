@@ -1,13 +1,17 @@
+import os
+import socket
 import sys
 import asyncio
-import json
-import pandas as pd
 import uvicorn
 import nest_asyncio
 import time
+import json
+import hashlib
 from typing import List
-from fastapi import FastAPI, BackgroundTasks, Query
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware # <--- IMPORANT IMPORT
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 
 # Allow nested event loops (Fixes Render/Playwright issues)
@@ -17,15 +21,50 @@ if sys.platform == "win32":
 
 # IMPORT MODULES
 # Ensure retailer_scraper.py and ai_matcher.py are in the same folder
-from retailer_scraper import scrape_all_retailers 
+from retailer_scraper import (scrape_all_retailers, background_scrapes, user_scrapes_active,
+                              current_scrape_class, in_background, promote_scrape)
 from ai_matcher import SmartMatcher
+from products import Product, as_products
+from browser_pool import pool as browser_pool
+import retailer_adapters
+import page_readiness
+from singleflight import SingleFlight
 import database
+import catalog
+import job_queue
+import cache_warmer
+import metrics
+import deals
 
 # ==========================================
 # 🔧 CONFIG & INIT
 # ==========================================
 app = FastAPI()
 
+# Max shopping-list items scraped at the same time in /api/compare
+COMPARE_CONCURRENCY = int(os.getenv("COMPARE_CONCURRENCY", "3"))
+
+# Coalesce concurrent scrapes of the same item (in-process always,
+# across uvicorn workers via a lease row in SQLite when enabled)
+scrape_flight = SingleFlight()
+CROSS_WORKER_SINGLEFLIGHT = os.getenv("CROSS_WORKER_SINGLEFLIGHT", "0") == "1"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+LEASE_TTL_SECONDS = 90
+LEASE_POLL_SECONDS = 1.0
+
+# Product cache TTLs: fresh < SOFT <= stale (served + refreshed) < HARD <= miss
+CACHE_SOFT_TTL = int(os.getenv("CACHE_SOFT_TTL_SECONDS", str(3600*4)))   # 4 Hours
+CACHE_HARD_TTL = int(os.getenv("CACHE_HARD_TTL_SECONDS", str(3600*24)))  # 24 Hours
+
+# Per-request stage breakdown in a Server-Timing response header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+# Bodies at least this big are gzipped for clients that accept it
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+# Streamed endpoints are never gzipped: depending on the Starlette version the
+# gzip writer holds chunks back until the response ends (NDJSON / SSE events)
+GZIP_SKIP_PATHS = {"/api/compare/stream"}
+
 # ✅ CORS FIX: This allows your Flutter App to talk to the Server
 app.add_middleware(
     CORSMiddleware,
@@ -33,12 +72,74 @@ app.add_middleware(
     allow_credentials=False, # <--- MUST BE FALSE for public APIs
     allow_methods=["*"],     # Allows POST, GET, OPTIONS
     allow_headers=["*"],     # Allows all headers
+    expose_headers=["ETag"],
 )
 
-# Initialize Database on Startup
+class GZipUnlessStreaming:
+    """GZipMiddleware for everything except GZIP_SKIP_PATHS, which go out as-is."""
+
+    def __init__(self, app, minimum_size: int, compresslevel: int):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in GZIP_SKIP_PATHS:
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+app.add_middleware(GZipUnlessStreaming, minimum_size=GZIP_MIN_BYTES, compresslevel=6)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    if not SERVER_TIMING:
+        return await call_next(request)
+    t0 = time.perf_counter()
+    timings = metrics.start_request_timing()
+    response = await call_next(request)
+    # Stages are summed over concurrent work (3 retailers' readiness can exceed total);
+    # streaming responses only have what ran before the first byte
+    response.headers["Server-Timing"] = metrics.server_timing_header(timings, time.perf_counter() - t0)
+    return response
+
+# Initialize Database + warm Browser Pool on Startup
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     database.init_db()
+    catalog.init_catalog()
+    database.add_maintenance_task(catalog.prune_catalog)
+    job_queue.init_jobs()
+    database.add_maintenance_task(job_queue.prune_jobs)
+    deals.init_deals()
+    database.add_save_listener(deals.on_save)
+    database.add_maintenance_task(deals.prune_deals)
+    try:
+        if await database.run_db(deals.needs_rebuild):
+            count = await database.run_db(deals.rebuild_index)
+            print(f"🏷️ DEALS: Built index from {count} cached items")
+    except Exception as e:
+        # /deals just starts empty and fills as items are saved
+        print(f"⚠️ Deals index build failed: {e}")
+    app.state.db_maintenance = asyncio.ensure_future(database.maintenance_loop())
+    try:
+        await browser_pool.start()
+    except Exception as e:
+        # Scraper will retry lazily on first cache miss
+        print(f"⚠️ Browser pool failed to start: {e}")
+    # Picks up jobs left pending by the previous run too
+    scrape_workers.start()
+    if cache_warmer.WARM_ENABLED:
+        warmer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await warmer.stop()
+    await scrape_workers.stop()
+    await browser_pool.stop()
+    await retailer_adapters.close_http_client()
+    app.state.db_maintenance.cancel()
+    await database.flush()
+    database.close()
 
 class CompareRequest(BaseModel):
     items: List[str]
@@ -46,70 +147,157 @@ class CompareRequest(BaseModel):
 # ==========================================
 # 🧠 HELPER FUNCTIONS
 # ==========================================
-def best_per_retailer(item: str, deals: List[dict]) -> List[dict]:
+@metrics.timed("best_per_retailer")
+def best_per_retailer(item: str, deals: List[Product]) -> List[dict]:
     """
     Groups results by Retailer and picks the ONE best option for each.
     """
     best = {}
-    for d in deals:
-        retailer = d.get("WINNER", "Unknown")
-        try: unit_price = float(d.get("Unit Price", 999999))
-        except: unit_price = 999999.0
-
+    for d in as_products(deals):
         # Keep the cheapest unit price per retailer
-        if retailer not in best or unit_price < float(best[retailer].get("Unit Price", 999999)):
-            best[retailer] = d
+        current = best.get(d.retailer)
+        if current is None or d.unit_price < current.unit_price:
+            best[d.retailer] = d
 
     out = []
     for retailer, d in best.items():
-        unit = d.get("BaseUnit", "unit")
-        try: raw_price = float(d.get("Price", 0))
-        except: raw_price = 0.0
-        try: raw_unit_price = float(d.get("Unit Price", 0))
-        except: raw_unit_price = 0.0
-        
         # Simple Promo logic (placeholder)
-        original_price = raw_price 
+        original_price = d.price 
         is_promo = False
 
         out.append({
             "WINNER": retailer,
-            "Product Name": d.get("Product Name", ""),
+            "Product Name": d.name,
             "Product Type": "",
-            "Best Price": f"฿{raw_price:.2f}",
-            "Unit Price": f"฿{raw_unit_price:.2f}/{unit}",
-            "_raw_price": raw_price,
-            "_raw_unit_price": raw_unit_price,
+            "Best Price": f"฿{d.price:.2f}",
+            "Unit Price": f"฿{d.unit_price:.2f}/{d.base_unit}",
+            "_raw_price": d.price,
+            "_raw_unit_price": d.unit_price,
             "is_promo": is_promo,
             "original_price": original_price if is_promo else None,
             "query_item": item,
         })
     
     # Sort by cheapest Unit Price
-    out.sort(key=lambda x: float(x.get("_raw_unit_price", 999999)))
+    out.sort(key=lambda x: x["_raw_unit_price"])
     return out
 
 # ==========================================
-# 🚀 BACKGROUND UPDATER
+# 🐢 SLOW PATH (Scrape -> AI Match -> Best)
 # ==========================================
-async def update_cache_background(item: str):
-    print(f"👷 BACKGROUND: Updating cache for '{item}'...")
+@metrics.timed("matcher")
+def match_products(item: str, products: List[Product]) -> List[Product]:
+    """
+    AI-match the candidates against the item, best first.
+    """
+    if not products: return []
     try:
-        raw_data = await scrape_all_retailers(item)
-        
-        # Process AI Logic here before saving
-        if raw_data:
-            df = pd.DataFrame(raw_data)
-            candidates = json.loads(df.to_json(orient="records"))
-            engine = SmartMatcher(candidates)
-            matches = engine.find_matches(item, threshold=0.25) # Lower threshold for simple matcher
-            final_best = best_per_retailer(item, matches[:30])
-            
-            # Save processed results to DB
-            database.save_to_cache(item, final_best)
-            print(f"✅ BACKGROUND: Saved {len(final_best)} deals for '{item}'")
+        engine = SmartMatcher(products)
+        return [p for _, p in engine.find_scored(item, threshold=0.25)][:30] # Lower threshold for simple matcher
     except Exception as e:
-        print(f"❌ BACKGROUND ERROR: {e}")
+        print(f"⚠️ AI Match Error: {e}")
+        return [] # Fail gracefully if AI crashes
+
+async def scrape_and_match(item: str) -> List[dict]:
+    """
+    Answers from the product catalog when it has fresh matches from enough
+    retailers; otherwise scrapes every retailer (and feeds the catalog).
+    """
+    known = await database.run_db(catalog.lookup, item)
+    if known:
+        matches = match_products(item, known)
+        if catalog.has_coverage(matches):
+            print(f"📚 CATALOG HIT: '{item}' from {len(known)} known products")
+            return best_per_retailer(item, matches)
+
+    raw_data = await scrape_all_retailers(item)
+    if raw_data:
+        await database.run_db(catalog.upsert_products, list(raw_data))
+
+    # AI Match (Product records go straight through, no DataFrame round-trip) -> Group Best
+    return best_per_retailer(item, match_products(item, raw_data))
+
+# ==========================================
+# 🛫 SINGLE-FLIGHT REFRESH (one scrape per item at a time)
+# ==========================================
+async def _wait_for_other_worker(item: str, since: float):
+    """
+    Another uvicorn worker holds the lease: wait for its result to land in the
+    cache (or for the lease to go away) instead of scraping the same thing.
+    """
+    deadline = time.time() + LEASE_TTL_SECONDS
+    while time.time() < deadline:
+        await asyncio.sleep(LEASE_POLL_SECONDS)
+        ts = await database.run_db(database.get_cache_timestamp, item)
+        if ts is not None and ts >= since:
+            entry = await database.aget_cached_entry(item, max_age_seconds=LEASE_TTL_SECONDS)
+            return entry[0] if entry else None
+        if not await database.run_db(database.lease_active, item):
+            return None
+    return None
+
+@metrics.timed("cache_write")
+async def _save(item: str, best_deals: List[dict]):
+    await database.asave_to_cache(item, best_deals)
+
+async def _scrape_and_save(item: str) -> List[dict]:
+    if CROSS_WORKER_SINGLEFLIGHT:
+        started = time.time()
+        if not await database.run_db(database.acquire_lease, item, WORKER_ID, LEASE_TTL_SECONDS):
+            print(f"🤝 '{item}' is being scraped by another worker, waiting...")
+            shared = await _wait_for_other_worker(item, started)
+            if shared is not None:
+                return shared
+            await database.run_db(database.acquire_lease, item, WORKER_ID, LEASE_TTL_SECONDS)
+        try:
+            best_deals = await scrape_and_match(item)
+            if best_deals:
+                await _save(item, best_deals)
+            return best_deals
+        finally:
+            await database.run_db(database.release_lease, item, WORKER_ID)
+
+    best_deals = await scrape_and_match(item)
+    if best_deals:
+        # Save to DB for next time
+        await _save(item, best_deals)
+    return best_deals
+
+async def refresh_item(item: str) -> List[dict]:
+    """
+    Scrape + match + save for one item. Concurrent callers for the same
+    (normalized) item share a single scrape: /api/compare misses,
+    /api/prime_cache and background updates all come through here.
+    A live request joining a background job's scrape promotes it to user priority.
+    """
+    key = database.normalize_query(item)
+    if not in_background():
+        promote_scrape(scrape_flight.tag(key))
+    return await scrape_flight.do(key, lambda: _scrape_and_save(item), tag=current_scrape_class())
+
+# ==========================================
+# 🚀 BACKGROUND UPDATER
+# ==========================================
+async def update_cache_background(item: str) -> bool:
+    """
+    Job-queue handler. Returning False / raising = retried later with backoff.
+    """
+    print(f"👷 BACKGROUND: Updating cache for '{item}'...")
+    with background_scrapes():  # behind live requests for browser pages
+        final_best = await refresh_item(item)
+    if final_best:
+        print(f"✅ BACKGROUND: Saved {len(final_best)} deals for '{item}'")
+    return bool(final_best)
+
+# Durable, prioritized queue (SQLite) drained by a fixed number of workers
+scrape_workers = job_queue.ScrapeWorkerPool(update_cache_background, yield_to=user_scrapes_active)
+# Keeps the most requested items fresh (off-peak, budgeted)
+warmer = cache_warmer.CacheWarmer(scrape_workers.submit, CACHE_SOFT_TTL)
+
+metrics.Gauge("item_scrapes_in_flight", "Distinct items being scraped right now (single-flight leaders).", fn=scrape_flight.in_flight)
+metrics.Gauge("job_workers_busy", "Queue workers running a job.", fn=lambda: scrape_workers.busy)
+metrics.Gauge("memory_cache_hit_ratio", "In-process cache tier hit ratio.", fn=lambda: database.memory.stats()["hit_ratio"])
+metrics.Gauge("memory_cache_bytes", "In-process cache tier size.", fn=lambda: database.memory.stats()["bytes"])
 
 # ==========================================
 # 🔌 API ENDPOINTS (FIXED)
@@ -122,80 +310,226 @@ def home():
 
 # ✅ 2. DEALS PAGE (Fixes Flutter App Crash)
 @app.get("/deals")
-async def get_deals(refresh: bool = False, query: str = Query(None)):
-    """
-    Returns a dummy list of deals so the Deals page loads.
-    """
-    return [
-        {
-            "WINNER": "System",
-            "Product Name": "Backend Online",
-            "Best Price": "฿0.00",
-            "Unit Price": "฿0.00/unit",
-            "_raw_price": 0,
-            "is_promo": True,
-            "original_price": 100,
-            "query_item": "Status"
-        }
-    ]
-
-# ✅ 3. BACKGROUND TRIGGER (Speed Booster)
+async def get_deals(refresh: bool = False, query: str = Query(None),
+                    sort: str = Query(deals.SORT_DROPS, pattern="^(drops|cheapest|spread)$"),
+                    limit: int = Query(50, ge=1, le=deals.DEALS_PAGE_MAX), offset: int = Query(0, ge=0),
+                    unit: str = Query(None, pattern="^(kg|L|egg|pcs)$")):
+    """
+    Ranked deals from the deals index (kept up to date by every cache write).
+    sort: drops (biggest unit-price drop first), cheapest (per unit, within
+    the same unit; `unit` picks one), spread (biggest price gap between
+    retailers). refresh + query re-scrapes that item in the background;
+    refresh alone has nothing to do, the index is already current.
+    """
+    if refresh and query:
+        await scrape_workers.submit([query], job_queue.PRIORITY_USER)
+    return await database.run_db(deals.ranked, sort, query, limit, offset, unit)
+
+# ✅ 3. BROWSER POOL STATS
+@app.get("/api/pool")
+def pool_stats():
+    return {**browser_pool.stats(), "readiness": page_readiness.stats.snapshot()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/cache_stats")
+def cache_stats():
+    return {"memory": database.memory.stats(), "warmer": warmer.stats()}
+
+# ✅ 4. BACKGROUND TRIGGER (Speed Booster)
 @app.post("/api/prime_cache")
-async def prime_cache(req: CompareRequest, background_tasks: BackgroundTasks):
+async def prime_cache(req: CompareRequest):
     """
     Manually trigger background scraping for a list of items.
     """
-    for item in req.items:
-        background_tasks.add_task(update_cache_background, item)
-    return {"status": "success", "message": f"Queued {len(req.items)} items for background scraping"}
+    queued = await scrape_workers.submit(req.items, job_queue.PRIORITY_PRIME)
+    return {"status": "success", "message": f"Queued {queued} items for background scraping"}
+
+@app.get("/api/jobs")
+async def jobs_status(status: str = Query(None), limit: int = 50):
+    return {**await database.run_db(job_queue.queue_status, status, limit), "workers": scrape_workers.stats()}
+
+# ✅ 5. SEARCH API (Main Feature)
+def _unique_items(raw_items: List[str]):
+    """
+    Caller's order (duplicates included) + normalized key -> first spelling the user sent.
+    """
+    items = [(item or "").strip() for item in raw_items]
+    items = [item for item in items if item]
+    unique_items = {}
+    for item in items:
+        unique_items.setdefault(database.normalize_query(item), item)
+    return items, unique_items
+
+async def _check_cache(unique_items: dict):
+    """
+    One batched lookup for the whole list. Returns (hits {key: (data, age, digest)},
+    misses [(key, item)], stale_items); stale hits are queued for refresh.
+    """
+    hits = {}
+    misses = []
+    stale_items = []
+    refresh = []
+    with metrics.stage("cache_lookup"):
+        # Stale memory copies are checked against the DB first: another worker may have refreshed them
+        cached = await database.aget_many(list(unique_items.values()), max_age_seconds=CACHE_HARD_TTL, with_digest=True,
+                                          recheck_age=CACHE_SOFT_TTL)
+    for key, item in unique_items.items():
+        entry = cached.get(key)
+        if entry and entry[0]:
+            hits[key] = entry
+            age = entry[1]
+            if age < CACHE_SOFT_TTL:
+                metrics.CACHE_LOOKUPS.inc(result="hit")
+                print(f"⚡ DB HIT: Serving '{item}' instantly!")
+            else:
+                metrics.CACHE_LOOKUPS.inc(result="stale")
+                # Stale-while-revalidate: serve now, refresh after the response
+                print(f"♻️ DB STALE ({age / 3600:.1f}h): Serving '{item}', refreshing in background")
+                stale_items.append({"query_item": item, "age_seconds": int(age)})
+                if not scrape_flight.is_running(key):
+                    refresh.append(item)
+        else:
+            metrics.CACHE_LOOKUPS.inc(result="miss")
+            misses.append((key, item))
+    if refresh:
+        # Someone is looking at these right now: ahead of primed items in the queue
+        await scrape_workers.submit(refresh, job_queue.PRIORITY_USER)
+    return hits, misses, stale_items
+
+async def _scrape_miss(item: str, sem: asyncio.Semaphore) -> List[dict]:
+    async with sem:
+        print(f"🐢 DB MISS: Scraping fresh for '{item}'...")
+        try:
+            return await refresh_item(item)
+        except Exception as e:
+            print(f"❌ Scrape Error for '{item}': {e}")
+            return []
+
+def _compare_etag(items: List[str], results: dict, digests: dict, stale_items: list) -> str:
+    """
+    Weak ETag from the per-item content digests, in request order. Cache hits
+    bring the digest of the exact data read (stored next to each row); fresh
+    scrapes are hashed here. Weak: stale_items' ages move without the prices changing.
+    """
+    h = hashlib.blake2b(digest_size=12)
+    for item in items:
+        key = database.normalize_query(item)
+        if digests.get(key) is None:
+            digests[key] = database.data_digest(results[key])
+        h.update(f"{key}={digests[key]};".encode("utf-8"))
+    for s in stale_items:
+        h.update(f"stale:{database.normalize_query(s['query_item'])};".encode("utf-8"))
+    return f'W/"{h.hexdigest()}"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    if not if_none_match: return False
+    if if_none_match.strip() == "*": return True
+    tag = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == tag for t in if_none_match.split(","))
 
-# ✅ 4. SEARCH API (Main Feature)
 @app.post("/api/compare")
-async def compare_prices(req: CompareRequest, background_tasks: BackgroundTasks):
+async def compare_prices(req: CompareRequest, request: Request, response: Response):
+    items, unique_items = _unique_items(req.items)
+
+    # A. CHECK DATABASE for the whole list up front (Instant Speed)
+    hits, misses, stale_items = await _check_cache(unique_items)
+    results = {key: entry[0] for key, entry in hits.items()}
+    digests = {key: entry[2] for key, entry in hits.items()}
+
+    # B. CACHE MISSES (Slow Scrape) - fanned out, bounded
+    if misses:
+        sem = asyncio.Semaphore(COMPARE_CONCURRENCY)
+        scraped = await asyncio.gather(*(_scrape_miss(item, sem) for _, item in misses))
+        results.update(zip((key for key, _ in misses), scraped))
+
+    # Popularity (after misses are saved, so they count too)
+    database.record_hits(list(unique_items.values()))
+
+    # Client already has this exact list: skip building / serializing the body
+    etag = _compare_etag(items, results, digests, stale_items)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     final_results = []
-    
-    for item in req.items:
-        clean_item = (item or "").strip()
-        if not clean_item: continue
-        
-        # A. CHECK DATABASE (Instant Speed)
-        cached_data = database.get_cached_data(clean_item, max_age_seconds=3600*4) # 4 Hours Cache
-        
-        if cached_data:
-            print(f"⚡ DB HIT: Serving '{clean_item}' instantly!")
-            final_results.extend(cached_data)
-        else:
-            # B. CACHE MISS (Slow Scrape)
-            print(f"🐢 DB MISS: Scraping fresh for '{clean_item}'...")
-            
-            # Scrape
-            raw_data = await scrape_all_retailers(clean_item)
-            
-            # AI Match
-            matches = []
-            if raw_data:
-                try:
-                    df = pd.DataFrame(raw_data)
-                    candidates = json.loads(df.to_json(orient="records"))
-                    engine = SmartMatcher(candidates)
-                    matches = engine.find_matches(clean_item, threshold=0.25)
-                except Exception as e:
-                    print(f"⚠️ AI Match Error: {e}")
-                    matches = [] # Fail gracefully if AI crashes
-            
-            # Group Best
-            best_deals = best_per_retailer(clean_item, matches[:30])
-            
-            # Save to DB for next time
-            database.save_to_cache(clean_item, best_deals)
-            
-            final_results.extend(best_deals)
+    for item in items:
+        final_results.extend(results[database.normalize_query(item)])
 
     return {
         "status": "success", 
         "message": "Comparison complete", 
-        "data": final_results
+        "data": final_results,
+        "stale_items": stale_items,
     }
 
+# ✅ 6. STREAMING SEARCH API (results as each item is ready)
+def _stream_event(fmt: str, event: str, payload: dict) -> str:
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    return json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+
+@app.post("/api/compare/stream")
+async def compare_prices_stream(req: CompareRequest, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    """
+    Same work as /api/compare, streamed: one "item" event per distinct item
+    (cached ones first, scraped ones as they finish), then a "summary" event.
+    "positions" are the item's indexes in the request, so the client can
+    keep the list order. NDJSON by default, Server-Sent Events with ?format=sse.
+    """
+    started = time.time()
+    items, unique_items = _unique_items(req.items)
+    positions = {}
+    for i, item in enumerate(items):
+        positions.setdefault(database.normalize_query(item), []).append(i)
+
+    async def events():
+        hits, misses, stale_items = await _check_cache(unique_items)
+        stale_keys = {database.normalize_query(s["query_item"]) for s in stale_items}
+        counts = {"cached": len(hits), "scraped": 0, "empty": 0}
+
+        def item_event(key: str, data: list, source: str, age: float = None) -> str:
+            if not data: counts["empty"] += 1
+            payload = {"query_item": unique_items[key], "positions": positions[key], "source": source, "data": data}
+            if age is not None: payload["age_seconds"] = int(age)
+            return _stream_event(format, "item", payload)
+
+        for key, (data, age, _) in hits.items():
+            yield item_event(key, data, "stale" if key in stale_keys else "cache", age)
+
+        sem = asyncio.Semaphore(COMPARE_CONCURRENCY)
+
+        async def scrape(key: str, item: str):
+            return key, await _scrape_miss(item, sem)
+
+        tasks = [asyncio.ensure_future(scrape(key, item)) for key, item in misses]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, data = await next_done
+                counts["scraped"] += 1
+                yield item_event(key, data, "scrape")
+        finally:
+            # Client went away: stop waiting (shared scrapes still finish and get cached)
+            for task in tasks:
+                task.cancel()
+
+        database.record_hits(list(unique_items.values()))
+        yield _stream_event(format, "summary", {
+            "status": "success",
+            "message": "Comparison complete",
+            "items": len(unique_items),
+            **counts,
+            "stale_items": stale_items,
+            "elapsed_ms": int((time.time() - started) * 1000),
+        })
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # no-transform / X-Accel-Buffering: keep proxies from buffering the stream
+    return StreamingResponse(events(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,317 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+import database
+from retailer_adapters import get_adapters
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+# Lower number = runs sooner
+PRIORITY_USER = 0      # live users are waiting on this item (stale refresh)
+PRIORITY_PRIME = 10    # /api/prime_cache
+PRIORITY_WARM = 20     # proactive cache warming
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "30"))     # 30s, 60s, 120s...
+JOB_STALE_SECONDS = 600          # "running" this long = its worker died, run it again
+JOB_RETENTION_SECONDS = 3600*24  # keep finished jobs a day for /api/jobs
+JOB_POLL_SECONDS = 2.0
+# While live requests are scraping, workers hold off starting new jobs (up to this long)
+JOB_YIELD_POLL_SECONDS = 0.5
+JOB_YIELD_MAX_SECONDS = float(os.getenv("JOB_YIELD_MAX_SECONDS", "30"))
+# Background scrapes hit each retailer at most once per this many seconds
+JOB_RETAILER_MIN_INTERVAL = float(os.getenv("JOB_RETAILER_MIN_INTERVAL", "2"))
+
+
+class Job:
+    def __init__(self, query: str, item: str, priority: int, attempts: int):
+        self.query = query
+        self.item = item
+        self.priority = priority
+        self.attempts = attempts
+
+# ==========================================
+# 🗄️ DURABLE QUEUE (SQLite)
+# ==========================================
+def init_jobs():
+    with database.connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_jobs (
+                query TEXT PRIMARY KEY,
+                item TEXT,
+                priority INTEGER,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                next_run_at REAL,
+                created_at REAL,
+                updated_at REAL,
+                last_error TEXT
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_scrape_jobs_due ON scrape_jobs (status, priority, next_run_at)")
+        conn.commit()
+
+def enqueue(items: List[str], priority: int = PRIORITY_PRIME) -> int:
+    """
+    Queue items (deduplicated by normalized query). An item already waiting
+    keeps its place but takes the better priority; finished/failed items
+    are queued again. Returns how many items were given.
+    """
+    now = time.time()
+    rows = []
+    for item in items:
+        key = database.normalize_query(item)
+        if key: rows.append((key, item.strip(), priority, now, now, now))
+    if not rows: return 0
+    with database.connection() as conn:
+        conn.executemany('''
+            INSERT INTO scrape_jobs (query, item, priority, status, attempts, next_run_at, created_at, updated_at)
+            VALUES (?, ?, ?, 'pending', 0, ?, ?, ?)
+            ON CONFLICT (query) DO UPDATE SET
+                priority = CASE WHEN scrape_jobs.status IN ('pending', 'running')
+                                THEN MIN(scrape_jobs.priority, excluded.priority) ELSE excluded.priority END,
+                attempts = CASE WHEN scrape_jobs.status IN ('pending', 'running')
+                                THEN scrape_jobs.attempts ELSE 0 END,
+                next_run_at = CASE WHEN scrape_jobs.status = 'running' THEN scrape_jobs.next_run_at
+                                   WHEN scrape_jobs.status = 'pending' THEN MIN(scrape_jobs.next_run_at, excluded.next_run_at)
+                                   ELSE excluded.next_run_at END,
+                status = CASE WHEN scrape_jobs.status IN ('pending', 'running')
+                              THEN scrape_jobs.status ELSE 'pending' END,
+                updated_at = excluded.updated_at
+        ''', rows)
+        conn.commit()
+    return len(rows)
+
+def claim_job() -> Optional[Job]:
+    """
+    Atomically take the most urgent due job (also re-takes jobs whose worker died).
+    """
+    now = time.time()
+    with database.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute('''
+            SELECT query, item, priority, attempts FROM scrape_jobs
+            WHERE (status = 'pending' AND next_run_at <= ?)
+               OR (status = 'running' AND updated_at < ?)
+            ORDER BY priority, next_run_at
+            LIMIT 1
+        ''', (now, now - JOB_STALE_SECONDS)).fetchone()
+        if row is None:
+            conn.commit()
+            return None
+        conn.execute("UPDATE scrape_jobs SET status = 'running', updated_at = ? WHERE query = ?", (now, row[0]))
+        conn.commit()
+    return Job(*row)
+
+def complete_job(job: Job):
+    with database.connection() as conn:
+        conn.execute(
+            "UPDATE scrape_jobs SET status = 'done', attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE query = ? AND status = 'running'",
+            (time.time(), job.query),
+        )
+        conn.commit()
+
+def fail_job(job: Job, error: str):
+    """
+    Retry with exponential backoff; give up after JOB_MAX_ATTEMPTS.
+    """
+    now = time.time()
+    attempts = job.attempts + 1
+    if attempts >= JOB_MAX_ATTEMPTS:
+        status, next_run_at = "failed", now
+    else:
+        status, next_run_at = "pending", now + JOB_BACKOFF_SECONDS * (2 ** (attempts - 1))
+    with database.connection() as conn:
+        conn.execute(
+            "UPDATE scrape_jobs SET status = ?, attempts = ?, next_run_at = ?, last_error = ?, updated_at = ? WHERE query = ? AND status = 'running'",
+            (status, attempts, next_run_at, (error or "")[:300], now, job.query),
+        )
+        conn.commit()
+
+def release_job(job: Job):
+    """Put a job we couldn't finish (shutdown) straight back in the queue."""
+    with database.connection() as conn:
+        conn.execute(
+            "UPDATE scrape_jobs SET status = 'pending', updated_at = ? WHERE query = ? AND status = 'running'",
+            (time.time(), job.query),
+        )
+        conn.commit()
+
+def active_queries(queries: List[str], failed_within: float = 3600) -> set:
+    """
+    Which of these normalized queries are queued / running already, or
+    gave up recently (don't keep spending scrapes on them).
+    """
+    if not queries: return set()
+    with database.connection() as conn:
+        rows = conn.execute(f'''
+            SELECT query FROM scrape_jobs
+            WHERE query IN ({','.join('?' * len(queries))})
+              AND (status IN ('pending', 'running') OR (status = 'failed' AND updated_at >= ?))
+        ''', [*queries, time.time() - failed_within]).fetchall()
+    return {r[0] for r in rows}
+
+def prune_jobs(max_age_seconds: int = JOB_RETENTION_SECONDS) -> int:
+    with database.connection() as conn:
+        cur = conn.execute(
+            "DELETE FROM scrape_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - max_age_seconds,),
+        )
+        conn.commit()
+        return cur.rowcount
+
+def queue_status(status: str = None, limit: int = 50) -> dict:
+    now = time.time()
+    with database.connection() as conn:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM scrape_jobs GROUP BY status").fetchall())
+        sql = "SELECT query, item, priority, status, attempts, next_run_at, updated_at, last_error FROM scrape_jobs"
+        args = []
+        if status:
+            sql += " WHERE status = ?"
+            args.append(status)
+        sql += " ORDER BY CASE status WHEN 'running' THEN 0 WHEN 'pending' THEN 1 ELSE 2 END, priority, next_run_at LIMIT ?"
+        args.append(limit)
+        rows = conn.execute(sql, args).fetchall()
+    return {
+        "depth": counts.get("pending", 0),
+        "by_status": counts,
+        "jobs": [
+            {
+                "query": r[0],
+                "item": r[1],
+                "priority": r[2],
+                "status": r[3],
+                "attempts": r[4],
+                "next_run_in_seconds": max(0, round(r[5] - now)) if r[3] == "pending" else None,
+                "updated_seconds_ago": round(now - r[6]),
+                "last_error": r[7],
+            }
+            for r in rows
+        ],
+    }
+
+# ==========================================
+# ⏱️ PER-RETAILER RATE LIMIT
+# ==========================================
+class RetailerRateLimiter:
+    """
+    Spaces out background scrapes per retailer (min_interval between starts).
+    """
+
+    def __init__(self, min_interval: float = JOB_RETAILER_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_at: Dict[str, float] = {}
+
+    async def acquire(self, retailers: List[str]):
+        # Reserve a slot on every retailer this scrape will hit, then wait for the latest
+        now = time.monotonic()
+        start_at = now
+        for name in retailers:
+            start_at = max(start_at, self._next_at.get(name, now))
+        for name in retailers:
+            self._next_at[name] = start_at + self.min_interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+# ==========================================
+# 👷 WORKER POOL
+# ==========================================
+class ScrapeWorkerPool:
+    """
+    Fixed number of async workers draining scrape_jobs in priority order.
+    The handler raises (or returns falsy) to have the job retried.
+    `yield_to()` > 0 means live requests are scraping: workers wait before
+    claiming the next job.
+    """
+
+    def __init__(self, handler: Callable[[str], Awaitable], workers: int = JOB_WORKERS,
+                 limiter: RetailerRateLimiter = None, yield_to: Callable[[], int] = None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.limiter = limiter or RetailerRateLimiter()
+        self.yield_to = yield_to
+        self.yields = 0
+        self._tasks = []
+        self._wake = None
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks: return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._run(n)) for n in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """Call after enqueue so idle workers don't wait for the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def submit(self, items: List[str], priority: int) -> int:
+        n = await database.run_db(enqueue, items, priority)
+        self.wake()
+        return n
+
+    async def _yield_to_users(self):
+        if self.yield_to is None or not self.yield_to(): return
+        self.yields += 1
+        deadline = time.monotonic() + JOB_YIELD_MAX_SECONDS
+        while self.yield_to() and time.monotonic() < deadline:
+            await asyncio.sleep(JOB_YIELD_POLL_SECONDS)
+
+    async def _next_job(self) -> Job:
+        await self._yield_to_users()
+        while True:
+            job = await database.run_db(claim_job)
+            if job is not None:
+                return job
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, n: int):
+        while True:
+            try:
+                job = await self._next_job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ JOB worker {n}: queue error {e}")
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                continue
+
+            self.busy += 1
+            try:
+                await self.limiter.acquire([a.name for a in get_adapters()])
+                print(f"👷 JOB worker {n}: '{job.item}' (priority {job.priority}, attempt {job.attempts + 1})")
+                ok = await self.handler(job.item)
+                if not ok:
+                    raise RuntimeError("no deals found")
+                await database.run_db(complete_job, job)
+                self.completed += 1
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back so it runs after restart (off the loop, and
+                # shielded so a second cancel doesn't drop the update)
+                await asyncio.shield(database.run_db(release_job, job))
+                raise
+            except Exception as e:
+                print(f"❌ JOB worker {n}: '{job.item}' failed: {e}")
+                await database.run_db(fail_job, job, str(e))
+                self.failed += 1
+            finally:
+                self.busy -= 1
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "busy": self.busy, "completed": self.completed, "failed": self.failed,
+                "yields": self.yields}
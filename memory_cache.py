@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # 32 MB
+MEMORY_CACHE_MAX_ITEMS = int(os.getenv("MEMORY_CACHE_MAX_ITEMS", "2000"))
+
+
+class MemoryCache:
+    """
+    Bounded LRU of already-decoded cache entries, in front of SQLite.
+    Entries keep the DB write timestamp, so ages / TTL decisions are the same
+    as reading the row from disk, and the payload's content digest (ETags).
+    Size is tracked as the JSON byte length.
+    Thread-safe: written from the DB thread pool and read on the event loop.
+    """
+
+    def __init__(self, max_bytes: int = MEMORY_CACHE_MAX_BYTES, max_items: int = MEMORY_CACHE_MAX_ITEMS,
+                 ttl_seconds: float = 3600*24):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[list, float, int, Optional[str]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str, max_age_seconds: float = None) -> Optional[Tuple[list, float, Optional[str]]]:
+        """(data, timestamp, digest) or None. Expired entries are dropped on the way."""
+        limit = min(max_age_seconds, self.ttl_seconds) if max_age_seconds is not None else self.ttl_seconds
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            data, timestamp, _, digest = entry
+            if time.time() - timestamp >= limit:
+                if time.time() - timestamp >= self.ttl_seconds:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data, timestamp, digest
+
+    def put(self, key: str, data: list, timestamp: float, size: int = None, digest: str = None):
+        if size is None:
+            size = len(json.dumps(data))
+        if size > self.max_bytes: return
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                if old[1] > timestamp: return  # never replace newer data with older
+                self._drop(key)
+            self._entries[key] = (data, timestamp, size, digest)
+            self._bytes += size
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_items):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: str):
+        size = self._entries.pop(key)[2]
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_items": self.max_items,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
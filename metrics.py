@@ -0,0 +1,228 @@
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+PREFIX = "grocery_"
+# Seconds; covers a 1ms cache hit up to a 30s whole-query scrape budget
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+_lock = threading.Lock()
+_registry: Dict[str, "_Metric"] = {}
+
+# Per-request stage timings for the Server-Timing header (None = not collecting)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def _labels_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(key, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _fmt_value(v: float) -> str:
+    if v == math.inf: return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = PREFIX + name
+        self.help = help
+        with _lock:
+            _registry[self.name] = self
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels_key(labels), 0)
+
+    def total(self) -> float:
+        """Sum over every label combination."""
+        with _lock:
+            return sum(self._values.values())
+
+    def samples(self) -> List[str]:
+        with _lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """
+    Set / inc / dec directly, or pass fn (returns {labels_tuple: value} or a
+    number) to read the value from elsewhere at scrape time.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable = None):
+        super().__init__(name, help)
+        self._values: Dict[tuple, float] = {}
+        self.fn = fn
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self._values[_labels_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return []
+            if value is None: return []
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            return [f"{self.name}{_fmt_labels(_labels_key(dict(k)))} {_fmt_value(v)}" for k, v in items if v is not None]
+        with _lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _labels_key(labels)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List[str]:
+        with _lock:
+            items = [(k, list(s)) for k, s in self._series.items()]
+        lines = []
+        for key, series in items:
+            running = 0
+            for bound, n in zip(self.buckets, series):
+                running += n
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, (('le', _fmt_value(bound)),))} {running}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(series[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {series[-1]}")
+        return lines
+
+
+def render() -> str:
+    """Everything in Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        metrics = list(_registry.values())
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ==========================================
+# ⏱️ STAGE TIMERS
+# ==========================================
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent per pipeline stage.")
+
+@contextmanager
+def stage(name: str, **labels):
+    """
+    Times a block into grocery_stage_seconds{stage=...} (and the current
+    request's Server-Timing breakdown, when one is being collected).
+    Works around awaits too: `with metrics.stage("navigation"): await page.goto(...)`.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=name, **labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+def timed(name: str):
+    """Decorator form of stage() for plain and async functions."""
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+def start_request_timing() -> Dict[str, float]:
+    """Collect stage timings for this request (and tasks it starts)."""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def server_timing_header(timings: Dict[str, float], total: float = None) -> str:
+    parts = [f"{name};dur={secs * 1000:.1f}" for name, secs in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+# ==========================================
+# 📊 SHARED METRICS
+# ==========================================
+SCRAPES = Counter("retailer_scrapes_total", "Retailer scrape attempts by outcome (success, empty, blocked, timeout, error).")
+SCRAPE_SECONDS = Histogram("retailer_scrape_seconds", "Wall time per retailer scrape.")
+SCRAPES_IN_FLIGHT = Gauge("retailer_scrapes_in_flight", "Retailer scrapes running right now.")
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Product cache lookups from /api/compare by result (hit, stale, miss).")
+
+def _cache_hit_ratio():
+    hits = CACHE_LOOKUPS.value(result="hit") + CACHE_LOOKUPS.value(result="stale")
+    total = hits + CACHE_LOOKUPS.value(result="miss")
+    return round(hits / total, 4) if total else None
+
+CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Share of compare lookups answered from cache (fresh or stale).", fn=_cache_hit_ratio)
@@ -0,0 +1,86 @@
+from typing import List, Dict, Tuple
+import lxml.html
+from lxml.cssselect import CSSSelector
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+# We keep 8 products per retailer, but some cards get dropped later
+# (no price / price <= 4), so scan a few more than that.
+CARD_SCAN_LIMIT = 24
+
+# Runs INSIDE the page: only the first N cards' name + text come back
+# (a few KB of JSON instead of the whole DOM).
+# Text is joined like BeautifulSoup's get_text(" ") so parsing stays identical.
+_EXTRACT_JS = """
+([cardSel, nameSel, limit]) => {
+    const SKIP = new Set(["SCRIPT", "STYLE", "NOSCRIPT", "TEMPLATE"]);
+    const text = (el) => {
+        const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+        const parts = [];
+        for (let n = walker.nextNode(); n; n = walker.nextNode()) {
+            if (n.parentNode && SKIP.has(n.parentNode.nodeName)) continue;
+            parts.push(n.nodeValue);
+        }
+        return parts.join(" ");
+    };
+    const all = document.querySelectorAll(cardSel);
+    const cards = [];
+    for (const card of all) {
+        if (cards.length >= limit) break;
+        const nameEl = card.querySelector(nameSel);
+        if (!nameEl) continue;
+        cards.push({ name: text(nameEl), text: text(card) });
+    }
+    return { total: all.length, cards: cards };
+}
+"""
+
+
+# ==========================================
+# 🧲 IN-BROWSER EXTRACTION
+# ==========================================
+async def extract_cards_in_page(page, selectors: dict, limit: int = CARD_SCAN_LIMIT) -> Tuple[int, List[Dict[str, str]]]:
+    """
+    Returns (cards_on_page, [{"name": ..., "text": ...}, ...]) for the first
+    `limit` cards that have a name element.
+    """
+    out = await page.evaluate(_EXTRACT_JS, [selectors["product_card"], selectors["name"], limit])
+    return int(out.get("total", 0)), out.get("cards", [])
+
+
+# ==========================================
+# 📄 OFFLINE FALLBACK (lxml)
+# ==========================================
+_selector_cache = {}
+
+def _css(selector: str) -> CSSSelector:
+    sel = _selector_cache.get(selector)
+    if sel is None:
+        sel = _selector_cache[selector] = CSSSelector(selector)
+    return sel
+
+def _text(el) -> str:
+    return " ".join(el.xpath(".//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::noscript) and not(ancestor::template)]"))
+
+def parse_cards_html(html: str, selectors: dict, limit: int = CARD_SCAN_LIMIT) -> Tuple[int, List[Dict[str, str]]]:
+    """
+    Same output as extract_cards_in_page, for HTML we already have
+    (page.content() fallback, plain HTTP fetches, recorded fixtures).
+    """
+    if not html or not html.strip():
+        return 0, []
+    try:
+        root = lxml.html.fromstring(html)
+    except (lxml.etree.ParserError, ValueError):
+        return 0, []
+
+    all_cards = _css(selectors["product_card"])(root)
+    name_sel = _css(selectors["name"])
+    cards = []
+    for card in all_cards:
+        if len(cards) >= limit: break
+        name_el = name_sel(card)
+        if not name_el: continue
+        cards.append({"name": _text(name_el[0]), "text": _text(card)})
+    return len(all_cards), cards
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional, Sequence
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+READY_MIN_CARDS = 8          # we never use more than 8 cards per retailer
+POLL_INTERVAL = 0.25         # seconds between DOM probes
+STABLE_POLLS = 3             # card count unchanged this many probes => done
+DEFAULT_TIMEOUT = float(os.getenv("READY_TIMEOUT_SECONDS", "10"))
+MIN_TIMEOUT = 3.0
+MAX_TIMEOUT = 15.0
+MIN_SAMPLES = 20             # before this, use DEFAULT_TIMEOUT
+TIMEOUT_RATE_LIMIT = 0.1     # too many timeouts => back off to MAX_TIMEOUT
+
+HISTOGRAM_BUCKETS = [0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0]
+
+BLOCK_TITLES = [
+    "just a moment",
+    "attention required",
+    "access denied",
+    "verify you are human",
+    "are you a robot",
+    "ddos-guard",
+]
+
+# One round-trip per probe: card count + title + challenge markers (+ "no results"
+# markers, only looked for while there are no cards)
+_PROBE_JS = """
+([sel, emptySel, emptyTexts]) => {
+    const count = document.querySelectorAll(sel).length;
+    let empty = false;
+    if (count === 0) {
+        empty = !!(emptySel && document.querySelector(emptySel));
+        if (!empty && emptyTexts.length && document.body) {
+            const text = document.body.innerText.toLowerCase();
+            empty = emptyTexts.some(t => text.includes(t));
+        }
+    }
+    return {
+        count: count,
+        empty: empty,
+        title: document.title || "",
+        challenge: !!document.querySelector('#challenge-form, #cf-challenge-running, #challenge-stage, .cf-browser-verification')
+    };
+}
+"""
+
+
+class ReadyResult:
+    def __init__(self, outcome: str, cards: int, elapsed: float, title: str):
+        self.outcome = outcome      # ready | stable | empty | blocked | timeout
+        self.cards = cards
+        self.elapsed = elapsed
+        self.title = title
+
+    @property
+    def blocked(self) -> bool:
+        return self.outcome == "blocked"
+
+    @property
+    def empty(self) -> bool:
+        return self.outcome == "empty"
+
+
+def is_block_title(title: str) -> bool:
+    t = (title or "").lower()
+    return any(b in t for b in BLOCK_TITLES)
+
+
+# ==========================================
+# 📊 TIME-TO-READY HISTOGRAMS
+# ==========================================
+class ReadinessStats:
+    """
+    Per-retailer time-to-ready histogram + recent samples.
+    The recent samples drive the adaptive timeout for the next page; pages
+    without cards (no results, or a timeout that never showed any) are left
+    out, so searches with no matches don't push every query to MAX_TIMEOUT.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._retailers = {}
+
+    def _entry(self, retailer: str) -> dict:
+        if retailer not in self._retailers:
+            self._retailers[retailer] = {
+                "buckets": [0] * (len(HISTOGRAM_BUCKETS) + 1),
+                "sum": 0.0,
+                "count": 0,
+                "outcomes": {"ready": 0, "stable": 0, "empty": 0, "blocked": 0, "timeout": 0},
+                "recent": deque(maxlen=self.window),
+            }
+        return self._retailers[retailer]
+
+    def record(self, retailer: str, result: ReadyResult):
+        e = self._entry(retailer)
+        e["outcomes"][result.outcome] = e["outcomes"].get(result.outcome, 0) + 1
+        if result.outcome in ("blocked", "empty") or (result.outcome == "timeout" and result.cards == 0):
+            return  # says nothing about card render time
+        e["recent"].append((result.elapsed, result.outcome == "timeout"))
+        if result.outcome in ("ready", "stable"):
+            i = 0
+            while i < len(HISTOGRAM_BUCKETS) and result.elapsed > HISTOGRAM_BUCKETS[i]:
+                i += 1
+            e["buckets"][i] += 1
+            e["sum"] += result.elapsed
+            e["count"] += 1
+
+    def percentile(self, retailer: str, pct: float) -> Optional[float]:
+        e = self._retailers.get(retailer)
+        if not e: return None
+        samples = sorted(t for t, timed_out in e["recent"] if not timed_out)
+        if not samples: return None
+        idx = min(len(samples) - 1, int(round(pct * (len(samples) - 1))))
+        return samples[idx]
+
+    def timeout_for(self, retailer: str) -> float:
+        e = self._retailers.get(retailer)
+        if not e or len(e["recent"]) < MIN_SAMPLES:
+            return DEFAULT_TIMEOUT
+        timeouts = sum(1 for _, timed_out in e["recent"] if timed_out)
+        if timeouts / len(e["recent"]) > TIMEOUT_RATE_LIMIT:
+            return MAX_TIMEOUT
+        p95 = self.percentile(retailer, 0.95)
+        if p95 is None:
+            return MAX_TIMEOUT
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, p95 * 1.5))
+
+    def snapshot(self) -> dict:
+        out = {}
+        for retailer, e in self._retailers.items():
+            out[retailer] = {
+                "buckets": {
+                    **{f"le_{b}": n for b, n in zip(HISTOGRAM_BUCKETS, e["buckets"])},
+                    "le_inf": e["buckets"][-1],
+                },
+                "count": e["count"],
+                "avg_seconds": round(e["sum"] / e["count"], 3) if e["count"] else None,
+                "p50_seconds": self.percentile(retailer, 0.5),
+                "p95_seconds": self.percentile(retailer, 0.95),
+                "outcomes": dict(e["outcomes"]),
+                "next_timeout_seconds": round(self.timeout_for(retailer), 2),
+            }
+        return out
+
+
+stats = ReadinessStats()
+
+
+# ==========================================
+# ⏳ READINESS ENGINE
+# ==========================================
+async def wait_until_ready(page, retailer: str, card_selector: str,
+                           min_cards: int = READY_MIN_CARDS, timeout: float = None,
+                           empty_selector: str = None, empty_texts: Sequence[str] = ()) -> ReadyResult:
+    """
+    Poll the page until enough product cards are rendered, the card count stops
+    changing, the retailer's "no results" marker shows up (empty_selector /
+    empty_texts), or a block/challenge page shows up. Replaces the fixed 5s sleep.
+    """
+    if timeout is None:
+        timeout = stats.timeout_for(retailer)
+
+    t0 = time.monotonic()
+    last_count = -1
+    stable = 0
+    title = ""
+    count = 0
+    outcome = "timeout"
+    texts = [t.lower() for t in empty_texts]
+
+    while True:
+        try:
+            probe = await page.evaluate(_PROBE_JS, [card_selector, empty_selector, texts])
+            count = int(probe.get("count", 0))
+            title = probe.get("title", "")
+            if probe.get("challenge") or is_block_title(title):
+                outcome = "blocked"
+                break
+            if probe.get("empty"):
+                outcome = "empty"
+                break
+        except Exception:
+            # Navigation in progress (execution context destroyed); try again
+            count = 0
+
+        if count >= min_cards:
+            outcome = "ready"
+            break
+        if count > 0 and count == last_count:
+            stable += 1
+            if stable >= STABLE_POLLS:
+                outcome = "stable"
+                break
+        else:
+            stable = 0
+        last_count = count
+
+        if time.monotonic() - t0 >= timeout:
+            break
+        await asyncio.sleep(POLL_INTERVAL)
+
+    result = ReadyResult(outcome, count, round(time.monotonic() - t0, 3), title)
+    stats.record(retailer, result)
+    return result
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+
+
+def _to_float(value, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass(slots=True)
+class Product:
+    """
+    One normalized product card. Prices are parsed to floats once, in the
+    scraper; the matcher and best_per_retailer work on these directly.
+    """
+    retailer: str
+    name: str
+    price: float
+    unit_price: float
+    base_qty: float = 1.0
+    base_unit: str = "pcs"
+    quantity: str = ""
+    product_type: str = ""
+
+    def to_dict(self) -> dict:
+        """Legacy row shape (what the scraper used to return)."""
+        return {
+            "WINNER": self.retailer,
+            "Product Name": self.name,
+            "Product Type": self.product_type,
+            "Quantity": self.quantity,
+            "BaseQty": self.base_qty,
+            "BaseUnit": self.base_unit,
+            "Price": self.price,
+            "Unit Price": self.unit_price,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Product":
+        return cls(
+            retailer=d.get("WINNER", "Unknown"),
+            name=str(d.get("Product Name", "")),
+            price=_to_float(d.get("Price", 0)),
+            unit_price=_to_float(d.get("Unit Price", 0)),
+            base_qty=_to_float(d.get("BaseQty", 1), 1.0),
+            base_unit=d.get("BaseUnit", "unit"),
+            quantity=d.get("Quantity", ""),
+            product_type=d.get("Product Type", ""),
+        )
+
+
+def as_products(rows) -> list:
+    """Accept Products or legacy dict rows; Products pass through untouched."""
+    return [r if isinstance(r, Product) else Product.from_dict(r) for r in (rows or [])]
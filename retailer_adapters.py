@@ -0,0 +1,227 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+import httpx
+from browser_pool import USER_AGENT
+from page_extraction import parse_cards_html
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+FETCH_BROWSER = "browser"   # always render in Chromium
+FETCH_HTTP = "http"         # plain HTTP GET + parser, never a browser
+FETCH_AUTO = "auto"         # try HTTP first, fall back to the browser if it finds nothing
+
+HTTP_TIMEOUT = float(os.getenv("RETAILER_HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("RETAILER_HTTP_MAX_CONNECTIONS", "20"))
+
+HTTP_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9,th;q=0.8",
+    "Referer": "https://www.google.com/",
+}
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.I | re.S)
+
+
+def _json_path(value, path: str):
+    """"data.products.0.name" -> value["data"]["products"][0]["name"], None if missing."""
+    for part in (path or "").split("."):
+        if not part: continue
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+    return value
+
+
+# ==========================================
+# 🏪 ADAPTER INTERFACE
+# ==========================================
+class RetailerAdapter:
+    """
+    One retailer = one adapter.
+    Subclasses set name / base_url / search_path / selectors and say whether
+    the search page can be served without a browser (fetch_mode).
+    HTTP adapters that hit a JSON/XHR endpoint set json_selectors:
+        {"items": "data.products", "name": "title", "text": ["price.final", "size"]}
+    (dotted paths; "items" is the product list, "text" fields - price first -
+    are joined into the card text the price / unit parsers read).
+    """
+    name = ""
+    base_url = ""
+    search_path = "/search/{q}"
+    selectors: Dict[str, str] = {}
+    json_selectors: Dict[str, object] = {}
+    # "No results" page markers: a CSS selector and/or texts (case-insensitive)
+    empty_selector: Optional[str] = None
+    empty_texts: Tuple[str, ...] = ("no results", "no products found", "ไม่พบสินค้า", "ไม่พบผลการค้นหา")
+    deadline = 25
+    fetch_mode = FETCH_BROWSER
+
+    def build_url(self, query: str) -> str:
+        return self.base_url + self.search_path.format(q=quote(query, safe=""))
+
+    @property
+    def uses_browser(self) -> bool:
+        return self.fetch_mode != FETCH_HTTP
+
+    @property
+    def tries_http(self) -> bool:
+        return self.fetch_mode in (FETCH_HTTP, FETCH_AUTO)
+
+    def parse_html(self, body: str) -> Tuple[int, List[Dict[str, str]]]:
+        return parse_cards_html(body, self.selectors)
+
+    def parse_json(self, payload) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        Cards from a JSON body via json_selectors. No selectors (or a body that
+        isn't a product list, like an error object) = no cards, so "auto"
+        adapters fall back to the browser.
+        """
+        sel = self.json_selectors
+        if not sel: return 0, []
+        items = _json_path(payload, sel.get("items", ""))
+        if not isinstance(items, list): return 0, []
+        text_paths = sel.get("text") or []
+        if isinstance(text_paths, str): text_paths = [text_paths]
+        cards = []
+        for item in items:
+            name = _json_path(item, sel.get("name", "name"))
+            if name in (None, ""): continue
+            # Price first (extract_price takes the first number), "|" keeps fields from running together
+            parts = [str(v) for v in (_json_path(item, p) for p in text_paths) if v not in (None, "")] + [str(name)]
+            cards.append({"name": str(name), "text": " | ".join(parts)})
+        return len(items), cards
+
+    def parse_response(self, body: str, content_type: str) -> Tuple[int, List[Dict[str, str]]]:
+        """Returns (cards_on_page, [{"name": ..., "text": ...}])"""
+        if "json" in (content_type or ""):
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return 0, []
+            return self.parse_json(payload)
+        return self.parse_html(body)
+
+    @staticmethod
+    def page_title(body: str) -> str:
+        m = _TITLE_RE.search(body or "")
+        return re.sub(r"\s+", " ", m.group(1)).strip() if m else ""
+
+
+class LotussAdapter(RetailerAdapter):
+    name = "Lotus's"
+    base_url = "https://www.lotuss.com"
+    search_path = "/en/search/{q}"
+    selectors = {
+        "product_card": 'div[class*="product-item"], div[class*="product-card"]',
+        "name": 'h6[class*="product-name"], a[class*="product-name"], div[class*="name"]',
+        "price": 'span[class*="price-final"], div[class*="price"]'
+    }
+
+    def build_url(self, query: str) -> str:
+        # Lotus's wants "/" left as-is in the path
+        return self.base_url + self.search_path.format(q=quote(query))
+
+
+class TopsAdapter(RetailerAdapter):
+    name = "Tops"
+    base_url = "https://www.tops.co.th"
+    search_path = "/en/search/{q}"
+    # Updated Tops Selectors
+    selectors = {
+        "product_card": "div.product-item",
+        "name": ".product-item-link, .product-name",
+        "price": ".price, .special-price .price"
+    }
+
+
+class MakroAdapter(RetailerAdapter):
+    name = "Makro"
+    base_url = "https://www.makro.pro"
+    search_path = "/en/c/search?q={q}"
+    selectors = {"product_card": 'div[class*="product-card"]', "name": 'span[class*="name"]', "price": 'span[class*="price"]'}
+
+
+# ==========================================
+# 📚 REGISTRY
+# ==========================================
+_registry: Dict[str, RetailerAdapter] = {}
+
+def register_adapter(adapter: RetailerAdapter) -> RetailerAdapter:
+    _registry[adapter.name] = adapter
+    return adapter
+
+def unregister_adapter(name: str):
+    _registry.pop(name, None)
+
+def get_adapter(name: str) -> Optional[RetailerAdapter]:
+    return _registry.get(name)
+
+def get_adapters() -> List[RetailerAdapter]:
+    """Registered adapters, in registration order (= result order)."""
+    return list(_registry.values())
+
+def set_base_url(name: str, base_url: str):
+    """Point a retailer at another host (e.g. a local stand-in server)."""
+    _registry[name].base_url = base_url.rstrip("/")
+
+def set_fetch_mode(name: str, mode: str):
+    if mode not in (FETCH_BROWSER, FETCH_HTTP, FETCH_AUTO):
+        raise ValueError(f"Unknown fetch mode: {mode}")
+    _registry[name].fetch_mode = mode
+
+def _parse_env_map(value: str) -> Dict[str, str]:
+    """'Tops=auto,Makro=http' -> {"Tops": "auto", "Makro": "http"}"""
+    out = {}
+    for part in (value or "").split(","):
+        if "=" not in part: continue
+        k, v = part.split("=", 1)
+        out[k.strip()] = v.strip()
+    return out
+
+def configure_from_env():
+    for name, mode in _parse_env_map(os.getenv("RETAILER_FETCH_MODES", "")).items():
+        if name in _registry: set_fetch_mode(name, mode)
+    for name, url in _parse_env_map(os.getenv("RETAILER_BASE_URLS", "")).items():
+        if name in _registry: set_base_url(name, url)
+
+
+register_adapter(LotussAdapter())
+register_adapter(TopsAdapter())
+register_adapter(MakroAdapter())
+configure_from_env()
+
+
+# ==========================================
+# 🌍 POOLED HTTP CLIENT
+# ==========================================
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            headers=HTTP_HEADERS,
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def fetch_http(adapter: RetailerAdapter, query: str, timeout: float = HTTP_TIMEOUT) -> Tuple[int, str, str]:
+    """GET the adapter's search URL. Returns (status, content_type, body)."""
+    resp = await get_http_client().get(adapter.build_url(query), timeout=timeout)
+    return resp.status_code, resp.headers.get("content-type", ""), resp.text
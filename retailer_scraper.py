@@ -1,227 +1,309 @@
 import asyncio
-import random
-import re
+import contextvars
+import os
 import gc 
-from typing import List, Dict, Any
-from urllib.parse import quote
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+import httpx
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from browser_pool import pool
+from page_readiness import wait_until_ready, is_block_title, stats as readiness
+from page_extraction import extract_cards_in_page, parse_cards_html
+from retailer_adapters import RetailerAdapter, get_adapters, fetch_http, HTTP_TIMEOUT
+from products import Product
+import metrics
 
 # ==========================================
 # 🔧 CONFIG & HELPERS
 # ==========================================
-USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-
-BROWSER_ARGS = [
-    "--disable-blink-features=AutomationControlled",
-    "--no-sandbox",
-    "--disable-setuid-sandbox",
-    "--disable-dev-shm-usage",
-    "--disable-accelerated-2d-canvas",
-    "--no-first-run",
-    "--no-zygote",
-    "--disable-gpu",
-    "--hide-scrollbars",
-    "--mute-audio",
-    "--ignore-certificate-errors",
-    "--window-size=1920,1080"
-]
-
-HEADLESS = True 
-
-# --- KEEP YOUR HELPER FUNCTIONS ---
-def clean_text(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip() if text else ""
-
-def extract_price(text: str) -> float:
-    if not text: return 0.0
-    t = text.replace(",", "").strip()
-    m = re.search(r"(?:฿|บาท|THB)?\s*(\d+(?:\.\d{1,2})?)", t, flags=re.I)
-    if m: return float(m.group(1))
-    return 0.0
-
-def extract_egg_quantity(text: str) -> float:
-    s = text.lower().replace(" ", "")
-    m = re.search(r"(\d+)(?:ฟอง|egg|eggs|pcs|ใบ)", s)
-    if m: return float(m.group(1))
-    m = re.search(r"(?:pack|แพ็ค|x)(\d+)", s)
-    if m: return float(m.group(1))
-    return 1.0
-
-def normalize_unit_data(name: str, raw_qty: str, price: float):
-    s = raw_qty.lower()
-    s = re.sub(r"\b(\d+)\s+\1\b", r"\1", s)
-    s = s.replace(" ", "")
-    name_lower = name.lower()
-    if "egg" in name_lower or "ไข่" in name_lower:
-        qty = extract_egg_quantity(name + " " + s)
-        return qty, "egg", round(price / qty, 2) if qty > 0 else price
-    unit_regex = r"(kg|kgs|kilo|g|gm|ml|l|liter|pack|packs|pcs|piece|pieces|ขวด|แพ็ค|แพค|ชิ้น|กระป๋อง|กล่อง|กรัม|ก\.|กิโลกรัม|กิโล|กก\.?|ก\.ก\.?|มล\.?|ลิตร|ล\.?)"
-    qty = 1.0; unit = "pcs"
-    m1 = re.search(rf"(\d+(?:\.\d+)?)[x\*](\d+(?:\.\d+)?){unit_regex}", s)
-    m2 = re.search(rf"(\d+(?:\.\d+)?){unit_regex}[x\*](\d+(?:\.\d+)?)", s)
-    m3 = re.search(rf"(\d+(?:\.\d+)?){unit_regex}", s)
-    if m1: qty = float(m1.group(1)) * float(m1.group(2)); unit = m1.group(3)
-    elif m2: qty = float(m2.group(1)) * float(m2.group(3)); unit = m2.group(2)
-    elif m3: qty = float(m3.group(1)); unit = m3.group(2)
-    final_qty = qty; final_unit = "pcs"
-    if unit in ["g", "gm", "กรัม", "ก."]: final_qty = qty / 1000.0; final_unit = "kg"
-    elif unit in ["ml", "มล."]: final_qty = qty / 1000.0; final_unit = "L"
-    elif any(u in unit for u in ["kg", "kilo", "กิโล", "กก", "l", "liter", "ลิตร", "ล."]):
-        final_qty = qty
-        if any(u in unit for u in ["l", "liter", "ลิตร", "ล."]): final_unit = "L"
-        else: final_unit = "kg"
-    if final_unit == "pcs":
-        is_fresh_food = any(w in name_lower for w in ["pork", "chicken", "salmon", "fish", "meat", "beef", "หมู", "ไก่", "ปลา", "เนื้อ", "แซลมอน"])
-        has_kg_keyword = any(w in name_lower for w in ["kg", "kilo", "กก", "กิโล", "/kg", "ต่อกก"])
-        if is_fresh_food and has_kg_keyword: final_unit = "kg"; final_qty = 1.0
-    if final_qty <= 0: final_qty = 1.0
-    return final_qty, final_unit, round(price / final_qty, 2)
-
-def clean_product_name(name: str, price: float) -> str:
-    if not name: return ""
-    x = name
-    x = re.sub(r"(?:buy|ซื้อ)\s*[\d,.]+\s*(?:B|฿|บาท)\s*(?:\+\d+)?", " ", x, flags=re.I)
-    x = re.sub(r"(?:get|รับ|earn|ฟรี)\s*[\d,.]+\s*(?:points|pts|คะแนน)", " ", x, flags=re.I)
-    x = re.sub(r"\bToday\s*[\d,.]*", " ", x, flags=re.I)
-    x = re.sub(r"\d+\+\s*units\s*-\d+%", " ", x, flags=re.I)
-    x = re.sub(r"^[\d,.]+\s*(?:/|-|บาท|THB|B)\s*(?:pack|pcs|ชิ้น|แพ็ค|kg|g|ขวด|กระป๋อง)?\s*", " ", x, flags=re.I)
-    x = re.sub(r"\s+\d{2,}\s*\d*\s*$", "", x)
-    x = re.sub(r"(฿|THB|บาท)", "", x, flags=re.I)
-    x = re.sub(r"\s+", " ", x).strip()
-    x = re.sub(r"^[^a-zA-Z0-9ก-๙\"'(]+", "", x)
-    return x[:120].strip()
+# Parsing helpers live in unit_parsing (precompiled + memoized); re-exported here
+from unit_parsing import clean_text, extract_price, extract_egg_quantity, normalize_unit_data, clean_product_name, parse_cards
+
+# Global cap on open pages across ALL concurrent scrapes
+MAX_OPEN_PAGES = int(os.getenv("SCRAPE_MAX_OPEN_PAGES", "3"))
+# Whole-query budget: whatever is done by then gets returned
+SCRAPE_BUDGET_SECONDS = float(os.getenv("SCRAPE_BUDGET_SECONDS", "30"))
+GOTO_TIMEOUT_MS = 20000
+# Background (job queue) scrapes never hold more than this many page slots,
+# so a big prime / warm run can't take every page while users wait
+BACKGROUND_MAX_PAGES = int(os.getenv("SCRAPE_BACKGROUND_MAX_PAGES", str(max(1, MAX_OPEN_PAGES - 1))))
+
+class ScrapeClass:
+    """
+    Who a scrape is for. Shared (by reference) with every task the scrape
+    starts, so a live request joining a background scrape can promote it.
+    """
+    def __init__(self, background: bool):
+        self.background = background
+        self.background_slots = 0   # page slots held that count against BACKGROUND_MAX_PAGES
+
+# Set by the job-queue handler; inherited by the scrape tasks it starts. None = a live request
+_scrape_class = contextvars.ContextVar("scrape_class", default=None)
+
+@contextmanager
+def background_scrapes():
+    """Scrapes started inside this block queue behind users for page slots."""
+    token = _scrape_class.set(ScrapeClass(background=True))
+    try:
+        yield
+    finally:
+        _scrape_class.reset(token)
+
+def current_scrape_class() -> Optional[ScrapeClass]:
+    return _scrape_class.get()
+
+def in_background() -> bool:
+    cls = _scrape_class.get()
+    return cls is not None and cls.background
+
+
+class PageSlots:
+    """
+    Global cap on open pages, handed out users first: waiting user scrapes
+    always go before waiting background ones, and background scrapes are
+    limited to `background_max` slots (the rest stay free for users).
+    """
+
+    def __init__(self, size: int, background_max: int):
+        self.size = size
+        self.background_max = min(background_max, size)
+        self.in_use = 0
+        self.background_in_use = 0
+        self._users = deque()        # (future, ScrapeClass or None)
+        self._background = deque()
+
+    def _free_for(self, background: bool) -> bool:
+        if self.in_use >= self.size: return False
+        return not background or self.background_in_use < self.background_max
+
+    def _grant(self, cls: Optional[ScrapeClass]):
+        self.in_use += 1
+        if cls is not None and cls.background:
+            self.background_in_use += 1
+            cls.background_slots += 1
+
+    def _wake(self):
+        for queue, background in ((self._users, False), (self._background, True)):
+            while queue and self._free_for(background):
+                fut, cls = queue.popleft()
+                if fut.done(): continue
+                self._grant(cls)
+                fut.set_result(None)
+
+    async def acquire(self, cls: Optional[ScrapeClass] = None):
+        background = cls is not None and cls.background
+        queue = self._background if background else self._users
+        # Don't jump a queue: background also waits behind any waiting user
+        if self._free_for(background) and not queue and not (background and self._users):
+            self._grant(cls)
+            return
+        waiter = (asyncio.get_running_loop().create_future(), cls)
+        queue.append(waiter)
+        try:
+            await waiter[0]
+        except asyncio.CancelledError:
+            if waiter[0].done() and not waiter[0].cancelled():
+                self.release(cls)  # granted just as we were cancelled
+            else:
+                for q in (self._users, self._background):
+                    if waiter in q: q.remove(waiter)
+            raise
+
+    def release(self, cls: Optional[ScrapeClass] = None):
+        self.in_use -= 1
+        if cls is not None and cls.background_slots:
+            cls.background_slots -= 1
+            self.background_in_use -= 1
+        self._wake()
+
+    def promote(self, cls: ScrapeClass):
+        """A live request now waits on this scrape: its slots and waiters count as a user's."""
+        self.background_in_use -= cls.background_slots
+        cls.background_slots = 0
+        for waiter in [w for w in self._background if w[1] is cls]:
+            self._background.remove(waiter)
+            self._users.append(waiter)
+        self._wake()
+
+    @property
+    def users_waiting(self) -> int:
+        return sum(1 for f, _ in self._users if not f.done())
+
+    async def __aenter__(self):
+        await self.acquire(_scrape_class.get())
+
+    async def __aexit__(self, *exc):
+        self.release(_scrape_class.get())
+
+_page_slots = PageSlots(MAX_OPEN_PAGES, BACKGROUND_MAX_PAGES)
+_running: List[Optional[ScrapeClass]] = []   # one entry per scrape_all_retailers call in progress
+
+def user_scrapes_active() -> int:
+    """Scrapes a live request is waiting on right now (background jobs back off while > 0)."""
+    return sum(1 for cls in _running if cls is None or not cls.background)
+
+def promote_scrape(cls: Optional[ScrapeClass]):
+    """A live request joined a background scrape: run it at user priority from here on."""
+    if cls is None or not cls.background: return
+    cls.background = False
+    _page_slots.promote(cls)
+
+
+class RetailerBlocked(Exception):
+    """Retailer served a bot-check / challenge page instead of results."""
+
+
+class ScrapeResult(list):
+    """
+    Product records found (a plain list for existing callers) plus which
+    retailers timed out, were blocked or failed, and how long each one took.
+    """
+    def __init__(self, items=(), timed_out=None, blocked=None, failed=None, elapsed=None):
+        super().__init__(items)
+        self.timed_out = timed_out or []
+        self.blocked = blocked or []
+        self.failed = failed or []
+        self.elapsed = elapsed or {}
 
 # ==========================================
-# 🚀 RAM-SAFE SCRAPER (Debug Edition)
+# 🚀 RAM-SAFE SCRAPER (Concurrent Edition)
 # ==========================================
-async def scrape_all_retailers(query: str) -> List[Dict[str, Any]]:
-    retailers = [
-        {
-            "name": "Lotus's",
-            "url_template": "https://www.lotuss.com/en/search/{q}",
-            "selectors": {
-                "product_card": 'div[class*="product-item"], div[class*="product-card"]', 
-                "name": 'h6[class*="product-name"], a[class*="product-name"], div[class*="name"]', 
-                "price": 'span[class*="price-final"], div[class*="price"]'
-            }
-        },
-        {
-            "name": "Tops",
-            "url_template": "https://www.tops.co.th/en/search/{q}",
-            # Updated Tops Selectors
-            "selectors": {
-                "product_card": "div.product-item", 
-                "name": ".product-item-link, .product-name", 
-                "price": ".price, .special-price .price"
-            }
-        },
-        {
-            "name": "Makro",
-            "url_template": "https://www.makro.pro/en/c/search?q={q}",
-            "selectors": {"product_card": 'div[class*="product-card"]', "name": 'span[class*="name"]', "price": 'span[class*="price"]'}
-        }
-    ]
+async def _scrape_http(adapter: RetailerAdapter, q_raw: str, deadline_at: float):
+    """Plain HTTP fetch + parse. Returns (cards_on_page, cards)."""
+    # Never longer than HTTP_TIMEOUT: "auto" adapters need the rest for the browser
+    timeout = max(1.0, min(HTTP_TIMEOUT, deadline_at - time.monotonic()))
+    with metrics.stage("http_fetch"):
+        status, content_type, body = await fetch_http(adapter, q_raw, timeout=timeout)
+    title = adapter.page_title(body) if "html" in content_type else ""
+    if status in (403, 429, 503) or is_block_title(title):
+        raise RetailerBlocked(title or f"HTTP {status}")
+    if status >= 400:
+        raise RuntimeError(f"HTTP {status}")
+    with metrics.stage("extraction"):
+        return adapter.parse_response(body, content_type)
 
-    all_results = []
+
+async def _scrape_browser(adapter: RetailerAdapter, q_raw: str, deadline_at: float):
+    """Chromium render via the shared pool. Returns (cards_on_page, cards)."""
+    async with pool.page() as page:
+        remaining_ms = max(1000, int((deadline_at - time.monotonic()) * 1000))
+        with metrics.stage("navigation"):
+            await page.goto(adapter.build_url(q_raw), timeout=min(GOTO_TIMEOUT_MS, remaining_ms), wait_until="domcontentloaded")
+
+        # Return as soon as cards render / settle, or bail on a block page
+        ready_timeout = min(readiness.timeout_for(adapter.name), max(0.5, deadline_at - time.monotonic()))
+        with metrics.stage("readiness"):
+            ready = await wait_until_ready(page, adapter.name, adapter.selectors["product_card"], timeout=ready_timeout,
+                                           empty_selector=adapter.empty_selector, empty_texts=adapter.empty_texts)
+        print(f"   📄 {adapter.name} {ready.outcome} in {ready.elapsed:.2f}s ({ready.cards} cards) - {ready.title}")
+        if ready.blocked:
+            raise RetailerBlocked(ready.title)
+        if ready.empty:
+            return 0, []
+
+        # Pull only the first N cards' text out of the page (no full-DOM copy)
+        with metrics.stage("extraction"):
+            try:
+                return await extract_cards_in_page(page, adapter.selectors)
+            except Exception as e:
+                print(f"   ↩️ {adapter.name} in-page extraction failed ({e}), parsing HTML instead")
+                return parse_cards_html(await page.content(), adapter.selectors)
+
+
+async def _scrape_retailer(adapter: RetailerAdapter, q_raw: str, deadline_at: float) -> List[Product]:
+    print(f"🛒 Scraping {adapter.name} ({adapter.fetch_mode})...")
+
+    total, cards = 0, []
+    if adapter.tries_http:
+        try:
+            total, cards = await _scrape_http(adapter, q_raw, deadline_at)
+        except Exception as e:
+            if not adapter.uses_browser: raise
+            print(f"   ↩️ {adapter.name} HTTP fetch failed ({e}), using browser")
+
+    if not cards and adapter.uses_browser:
+        async with _page_slots:
+            total, cards = await _scrape_browser(adapter, q_raw, deadline_at)
+    
+    print(f"   🔍 {adapter.name}: Found {total} cards on page.") # Debug print
+    return build_products(adapter.name, cards)
+
+
+@metrics.timed("parsing")
+def build_products(retailer: str, cards: List[Dict[str, str]], max_items: int = 8) -> List[Product]:
+    """
+    Turns extracted {"name", "text"} cards into normalized Product records.
+    """
+    return parse_cards(retailer, cards, max_items)
+
+
+async def scrape_all_retailers(query: str, budget_seconds: float = SCRAPE_BUDGET_SECONDS) -> ScrapeResult:
     q_raw = (query or "").strip()
-    if not q_raw: return []
-    q_encoded = quote(q_raw, safe="")
+    if not q_raw: return ScrapeResult()
+    entry = _scrape_class.get()
+    _running.append(entry)
+    try:
+        return await _scrape_all(q_raw, budget_seconds)
+    finally:
+        _running.remove(entry)
+
+
+async def _scrape_all(q_raw: str, budget_seconds: float) -> ScrapeResult:
+    adapters = get_adapters()
 
     print(f"🚀 RAM-SAFE Scrape Started: {q_raw}")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=HEADLESS, args=BROWSER_ARGS)
-        
-        for shop in retailers:
-            print(f"🛒 Scraping {shop['name']}...")
-            
-            context = await browser.new_context(
-                user_agent=USER_AGENT,
-                viewport={"width": 1920, "height": 1080},
-                locale="th-TH",
-                ignore_https_errors=True,
-                java_script_enabled=True
+    per_shop = {}
+    timed_out = []
+    blocked = []
+    failed = []
+    elapsed = {}
+
+    async def run(adapter):
+        name = adapter.name
+        t0 = time.monotonic()
+        deadline = adapter.deadline or budget_seconds
+        outcome = "timeout"  # also what a budget cancel counts as
+        metrics.SCRAPES_IN_FLIGHT.inc(retailer=name)
+        try:
+            per_shop[name] = await asyncio.wait_for(
+                _scrape_retailer(adapter, q_raw, t0 + deadline), timeout=deadline
             )
-            
-            await context.set_extra_http_headers({
-                "Accept-Language": "en-US,en;q=0.9,th;q=0.8",
-                "Referer": "https://www.google.com/",
-                "Upgrade-Insecure-Requests": "1"
-            })
-
-            # Block heavy resources
-            await context.route("**/*", lambda route, request: route.abort() if request.resource_type in ["image", "media", "font"] else route.continue_())
-
-            page = await context.new_page()
-            await page.add_init_script("Object.defineProperty(navigator, 'webdriver', { get: () => undefined });")
-            
-            try:
-                final_url = shop["url_template"].format(q=q_encoded)
-                if shop["name"] == "Lotus's":
-                    final_url = f"https://www.lotuss.com/en/search/{quote(q_raw)}"
-
-                try:
-                    await page.goto(final_url, timeout=20000, wait_until="domcontentloaded")
-                    
-                    # ⚠️ DEBUG: FORCE WAIT & PRINT TITLE
-                    # This lets us see if we are blocked ("Just a moment...") or just loading slow
-                    await page.wait_for_timeout(5000) 
-                    title = await page.title()
-                    print(f"   📄 Page Title: {title}") 
-
-                    try:
-                        await page.wait_for_selector(shop["selectors"]["product_card"], timeout=5000)
-                    except:
-                        pass
-
-                    content = await page.content()
-                    soup = BeautifulSoup(content, "html.parser")
-                    cards = soup.select(shop["selectors"]["product_card"])
-                    
-                    print(f"   🔍 Found {len(cards)} cards on page.") # Debug print
-
-                    count = 0
-                    for card in cards:
-                        if count >= 8: break 
-                        try:
-                            name_el = card.select_one(shop["selectors"]["name"])
-                            if not name_el: continue
-                            
-                            raw_name = clean_text(name_el.get_text(" "))
-                            card_text = clean_text(card.get_text(" "))
-                            price = extract_price(card_text)
-                            
-                            if price <= 4: continue
-
-                            final_name = clean_product_name(raw_name, price)
-                            qty, unit, u_price = normalize_unit_data(final_name, card_text, price)
-
-                            all_results.append({
-                                "WINNER": shop["name"],
-                                "Product Name": final_name,
-                                "Product Type": "",
-                                "Quantity": card_text[:50],
-                                "BaseQty": qty,
-                                "BaseUnit": unit,
-                                "Price": price,
-                                "Unit Price": u_price,
-                            })
-                            count += 1
-                        except: continue
-
-                except Exception as e:
-                    print(f"   ⚠️ {shop['name']} Timeout/Error: {e}")
+            outcome = "success" if per_shop[name] else "empty"
+        except (asyncio.TimeoutError, PlaywrightTimeoutError, httpx.TimeoutException) as e:
+            print(f"   ⏱️ {name} Timeout: {e or 'deadline exceeded'}")
+            timed_out.append(name)
+        except RetailerBlocked as e:
+            print(f"   🚫 {name} Blocked: {e}")
+            blocked.append(name)
+            outcome = "blocked"
+        except Exception as e:
+            print(f"   ⚠️ {name} Error: {e}")
+            failed.append(name)
+            outcome = "error"
+        finally:
+            elapsed[name] = round(time.monotonic() - t0, 2)
+            metrics.SCRAPES_IN_FLIGHT.dec(retailer=name)
+            metrics.SCRAPES.inc(retailer=name, outcome=outcome)
+            metrics.SCRAPE_SECONDS.observe(time.monotonic() - t0, retailer=name)
+
+    # Retailers run side by side (browser pages come from the shared pool)
+    tasks = {asyncio.ensure_future(run(adapter)): adapter.name for adapter in adapters}
+    _, pending = await asyncio.wait(tasks, timeout=budget_seconds)
+    for task in pending:
+        task.cancel()
+        if tasks[task] not in timed_out:
+            timed_out.append(tasks[task])
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        print(f"   ⏱️ Budget of {budget_seconds:.0f}s used up, returning partial results")
+
+    all_results = []
+    for adapter in adapters:
+        all_results.extend(per_shop.get(adapter.name, []))
+    gc.collect()
 
-            except Exception as e:
-                print(f"   ❌ Critical {shop['name']}: {e}")
-            
-            finally:
-                await page.close()
-                await context.close()
-                gc.collect() 
-        
-        await browser.close()
-    
     print(f"✅ Batch Scrape Complete. Found {len(all_results)} items.")
-    return all_results
\ No newline at end of file
+    return ScrapeResult(all_results, timed_out=timed_out, blocked=blocked, failed=failed, elapsed=elapsed)
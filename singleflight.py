@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls by key: the first caller starts the work, everyone
+    else asking for the same key while it runs awaits that same task.
+    The work runs in its own task, so a caller that disconnects (cancelled)
+    doesn't kill the scrape the others are waiting on.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tags: Dict[str, Any] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def is_running(self, key: str) -> bool:
+        return key in self._inflight
+
+    def tag(self, key: str) -> Optional[Any]:
+        """Whatever the leader passed as `tag` for the running call (None if idle)."""
+        return self._tags.get(key)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], tag: Any = None) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._tags[key] = tag
+
+            def _done(_t):
+                self._inflight.pop(key, None)
+                self._tags.pop(key, None)
+            task.add_done_callback(_done)
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
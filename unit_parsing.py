@@ -0,0 +1,159 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from products import Product
+
+# ==========================================
+# 🔧 CONFIG
+# ==========================================
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "8192"))
+
+# ==========================================
+# 🧩 PATTERNS (compiled once, same regex text as the original helpers)
+# ==========================================
+_WS_RE = re.compile(r"\s+")
+_PRICE_RE = re.compile(r"(?:฿|บาท|THB)?\s*(\d+(?:\.\d{1,2})?)", re.I)
+_EGG_COUNT_RE = re.compile(r"(\d+)(?:ฟอง|egg|eggs|pcs|ใบ)")
+_EGG_PACK_RE = re.compile(r"(?:pack|แพ็ค|x)(\d+)")
+_REPEATED_NUMBER_RE = re.compile(r"\b(\d+)\s+\1\b")
+
+UNIT_REGEX = r"(kg|kgs|kilo|g|gm|ml|l|liter|pack|packs|pcs|piece|pieces|ขวด|แพ็ค|แพค|ชิ้น|กระป๋อง|กล่อง|กรัม|ก\.|กิโลกรัม|กิโล|กก\.?|ก\.ก\.?|มล\.?|ลิตร|ล\.?)"
+_MULTI_PACK_RE = re.compile(rf"(\d+(?:\.\d+)?)[x\*](\d+(?:\.\d+)?){UNIT_REGEX}")   # 6x200ml
+_PACK_MULTI_RE = re.compile(rf"(\d+(?:\.\d+)?){UNIT_REGEX}[x\*](\d+(?:\.\d+)?)")   # 200mlx6
+_SINGLE_RE = re.compile(rf"(\d+(?:\.\d+)?){UNIT_REGEX}")                          # 500g
+
+# Every string UNIT_REGEX can capture -> (divide qty by, canonical unit).
+# Reproduces the original if/elif chain exactly, quirks included: "kilo"
+# lands on L (it contains "l"), and "มล" / "ล" / "ก.ก" without the dot keep
+# their number as a piece count.
+UNIT_ALIASES: Dict[str, Tuple[float, str]] = {
+    "g": (1000.0, "kg"), "gm": (1000.0, "kg"), "กรัม": (1000.0, "kg"), "ก.": (1000.0, "kg"),
+    "ml": (1000.0, "L"), "มล.": (1000.0, "L"),
+    "kg": (1, "kg"), "kgs": (1, "kg"), "กิโล": (1, "kg"), "กิโลกรัม": (1, "kg"), "กก": (1, "kg"), "กก.": (1, "kg"),
+    "kilo": (1, "L"),
+    "l": (1, "L"), "liter": (1, "L"), "ลิตร": (1, "L"), "ล.": (1, "L"),
+    "pack": (1, "pcs"), "packs": (1, "pcs"), "pcs": (1, "pcs"), "piece": (1, "pcs"), "pieces": (1, "pcs"),
+    "ขวด": (1, "pcs"), "แพ็ค": (1, "pcs"), "แพค": (1, "pcs"), "ชิ้น": (1, "pcs"), "กระป๋อง": (1, "pcs"),
+    "กล่อง": (1, "pcs"), "ก.ก": (1, "pcs"), "ก.ก.": (1, "pcs"), "มล": (1, "pcs"), "ล": (1, "pcs"),
+}
+
+# Keyword lists folded into one alternation each: one scan instead of one `in` per word
+FRESH_FOOD_WORDS = ["pork", "chicken", "salmon", "fish", "meat", "beef", "หมู", "ไก่", "ปลา", "เนื้อ", "แซลมอน"]
+KG_WORDS = ["kg", "kilo", "กก", "กิโล", "/kg", "ต่อกก"]
+_FRESH_FOOD_RE = re.compile("|".join(map(re.escape, FRESH_FOOD_WORDS)))
+_KG_WORD_RE = re.compile("|".join(map(re.escape, KG_WORDS)))
+_EGG_WORD_RE = re.compile("egg|ไข่")
+
+# Name cleanup, applied in this order
+_NAME_SUBS = [
+    (re.compile(r"(?:buy|ซื้อ)\s*[\d,.]+\s*(?:B|฿|บาท)\s*(?:\+\d+)?", re.I), " "),
+    (re.compile(r"(?:get|รับ|earn|ฟรี)\s*[\d,.]+\s*(?:points|pts|คะแนน)", re.I), " "),
+    (re.compile(r"\bToday\s*[\d,.]*", re.I), " "),
+    (re.compile(r"\d+\+\s*units\s*-\d+%", re.I), " "),
+    (re.compile(r"^[\d,.]+\s*(?:/|-|บาท|THB|B)\s*(?:pack|pcs|ชิ้น|แพ็ค|kg|g|ขวด|กระป๋อง)?\s*", re.I), " "),
+    (re.compile(r"\s+\d{2,}\s*\d*\s*$"), ""),
+    (re.compile(r"(฿|THB|บาท)", re.I), ""),
+]
+_LEADING_JUNK_RE = re.compile(r"^[^a-zA-Z0-9ก-๙\"'(]+")
+
+# ==========================================
+# 🧮 PARSERS
+# ==========================================
+def clean_text(text: str) -> str:
+    return _WS_RE.sub(" ", text).strip() if text else ""
+
+def extract_price(text: str) -> float:
+    if not text: return 0.0
+    m = _PRICE_RE.search(text.replace(",", "").strip())
+    if m: return float(m.group(1))
+    return 0.0
+
+def extract_egg_quantity(text: str) -> float:
+    s = text.lower().replace(" ", "")
+    m = _EGG_COUNT_RE.search(s)
+    if m: return float(m.group(1))
+    m = _EGG_PACK_RE.search(s)
+    if m: return float(m.group(1))
+    return 1.0
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _quantity(name: str, raw_qty: str) -> Tuple[float, str]:
+    """(qty, canonical unit) for a product; the price-independent part of normalize_unit_data."""
+    s = _REPEATED_NUMBER_RE.sub(r"\1", raw_qty.lower()).replace(" ", "")
+    name_lower = name.lower()
+    if _EGG_WORD_RE.search(name_lower):
+        return extract_egg_quantity(name + " " + s), "egg"
+
+    qty = 1.0; unit = "pcs"
+    m = _MULTI_PACK_RE.search(s)
+    if m:
+        qty = float(m.group(1)) * float(m.group(2)); unit = m.group(3)
+    else:
+        m = _PACK_MULTI_RE.search(s)
+        if m:
+            qty = float(m.group(1)) * float(m.group(3)); unit = m.group(2)
+        else:
+            m = _SINGLE_RE.search(s)
+            if m: qty = float(m.group(1)); unit = m.group(2)
+
+    divisor, final_unit = UNIT_ALIASES.get(unit, (1, "pcs"))
+    final_qty = qty / divisor if divisor != 1 else qty
+    if final_unit == "pcs" and _FRESH_FOOD_RE.search(name_lower) and _KG_WORD_RE.search(name_lower):
+        final_unit = "kg"; final_qty = 1.0
+    if final_qty <= 0: final_qty = 1.0
+    return final_qty, final_unit
+
+def normalize_unit_data(name: str, raw_qty: str, price: float):
+    """(qty, unit, price per unit) - unit is kg, L, egg or pcs."""
+    qty, unit = _quantity(name, raw_qty)
+    if unit == "egg":
+        return qty, unit, round(price / qty, 2) if qty > 0 else price
+    return qty, unit, round(price / qty, 2)
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _clean_name(name: str) -> str:
+    x = name
+    for pattern, repl in _NAME_SUBS:
+        x = pattern.sub(repl, x)
+    x = _WS_RE.sub(" ", x).strip()
+    x = _LEADING_JUNK_RE.sub("", x)
+    return x[:120].strip()
+
+def clean_product_name(name: str, price: float) -> str:
+    if not name: return ""
+    return _clean_name(name)
+
+# ==========================================
+# 📦 BATCH (one retailer page at a time)
+# ==========================================
+def parse_cards(retailer: str, cards: List[Dict[str, str]], max_items: int = 8) -> List[Product]:
+    """
+    Turns extracted {"name", "text"} cards into normalized Product records.
+    """
+    results = []
+    for card in cards:
+        if len(results) >= max_items: break
+        try:
+            card_text = clean_text(card["text"])
+            price = extract_price(card_text)
+            if price <= 4: continue
+
+            final_name = clean_product_name(clean_text(card["name"]), price)
+            qty, unit, u_price = normalize_unit_data(final_name, card_text, price)
+            results.append(Product(
+                retailer=retailer,
+                name=final_name,
+                price=price,
+                unit_price=u_price,
+                base_qty=qty,
+                base_unit=unit,
+                quantity=card_text[:50],
+            ))
+        except Exception:
+            continue
+    return results
+
+def cache_info() -> dict:
+    q, n = _quantity.cache_info(), _clean_name.cache_info()
+    return {"quantity": q._asdict(), "names": n._asdict()}